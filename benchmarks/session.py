@@ -0,0 +1,189 @@
+"""
+Benchmarks against an in-process fake Appium server (no device or Appium install required).
+
+    python benchmarks/session.py --latency_ms 20
+
+* fixture setup: `driver_session_` (first test) and `appium_extended` (following tests)
+* AppiumReportPlugin capture (appium_capture_debug=always) per test
+* proxy dispatch overhead of `appium_extended` against the bare driver
+* `swipe_element` and `find_element_on_page` with client swipes and device-side scroll (wall time and round trips)
+* report screenshot transcoding (size and encode time of a tablet sized screenshot, requires Pillow)
+* UiSelector building (see uiselector.py)
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import timeit
+from time import perf_counter
+
+import pytest
+from appium import webdriver
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pytest_appium import screenshots
+from pytest_appium.fake_server import FakeAppiumServer
+from pytest_appium.driver.proxy import appium_extensions
+from pytest_appium.driver.proxy.proxy_mixin import DEFAULT_REGISTRATION_NAME, proxy
+
+import uiselector
+
+
+CAPABILITIES = {'platformName': 'Android', 'deviceName': 'Fake', 'appPackage': 'com.example'}
+
+TEST_MODULE = '''
+import pytest
+
+
+@pytest.mark.parametrize('n', range({tests}))
+def test_appium_extended(appium_extended, n):
+    appium_extended.find_element_safe('id', 'com.example:id/title')
+'''
+
+
+class _Timings():
+    """pytest plugin recording setup and report (debug capture) durations"""
+    def __init__(self):
+        self.setup = []
+        self.makereport = []
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == 'setup':
+            self.setup.append(report.duration)
+
+    @pytest.hookimpl(hookwrapper=True, tryfirst=True)
+    def pytest_runtest_makereport(self, item, call):
+        start = perf_counter()
+        yield
+        self.makereport.append(perf_counter() - start)
+
+
+def _ms(seconds):
+    return f'{seconds * 1000:8.2f} ms'
+
+
+def bench_fixtures(server, tests):
+    host, port = server.url.split('//')[1].split('/')[0].split(':')
+    timings = _Timings()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(os.path.join(tmpdir, 'test_bench.py'), 'w') as filehandle:
+            filehandle.write(TEST_MODULE.format(tests=tests))
+        args = [
+            tmpdir, '-q', '-p', 'pytest_appium', '-p', 'no:cacheprovider', '--assert=plain',
+            '--appium_host', host, '--appium_port', port,
+            '--html', os.path.join(tmpdir, 'report.html'),
+            '-o', 'appium_capture_debug=always',
+        ]
+        for key, value in CAPABILITIES.items():
+            args += ['--capability', key, value]
+        exit_code = pytest.main(args, plugins=[timings])
+    assert exit_code == 0, f'benchmark test run failed ({exit_code})'
+    print(f'{"driver_session_ + appium_extended setup":<44} {_ms(timings.setup[0])}')
+    print(f'{"appium_extended setup (per test)":<44} {_ms(statistics.median(timings.setup[1:]))}')
+    print(f'{"makereport with debug capture (per phase)":<44} {_ms(statistics.median(timings.makereport))}')
+
+
+def bench_proxy(server, number):
+    driver = webdriver.Remote(command_executor=server.url, desired_capabilities=CAPABILITIES)
+    try:
+        extended = proxy(driver, DEFAULT_REGISTRATION_NAME, 'android')
+        platform = appium_extensions.PlatformShortcutMixin.platform.fget
+        for name, func in {
+            'attribute (bare driver)': lambda: driver.session_id,
+            'attribute (appium_extended)': lambda: extended.session_id,
+            'mixin property (unbound call)': lambda: platform(driver),
+            'mixin property (appium_extended)': lambda: extended.platform,
+            'build proxy (cached class)': lambda: proxy(driver, DEFAULT_REGISTRATION_NAME, 'android'),
+        }.items():
+            seconds = min(timeit.repeat(func, number=number, repeat=5))
+            print(f'{name:<44} {seconds / number * 1e6:8.2f} us')
+    finally:
+        driver.quit()
+
+
+def _measure(server, func):
+    """(seconds, requests to the server) taken by func()"""
+    requests = sum(server.requests.values())
+    start = perf_counter()
+    func()
+    return perf_counter() - start, sum(server.requests.values()) - requests
+
+
+def bench_find_element_on_page(server, swipes_needed, repeat):
+    driver = webdriver.Remote(command_executor=server.url, desired_capabilities=CAPABILITIES)
+    try:
+        extended = proxy(driver, DEFAULT_REGISTRATION_NAME, 'android')
+        seconds, requests = _measure(server, lambda: extended.swipe_element(repeat=swipes_needed))
+        print(f'{"swipe_element repeat=" + str(swipes_needed):<44} {_ms(seconds)} {requests:5.0f} round trips')
+        server.elements['com.example:id/far'] = swipes_needed
+        for name, locator, native_scroll in (
+            ('found (swipes)', ('id', 'com.example:id/far'), False),
+            ('missing (swipes)', ('id', 'com.example:id/missing'), False),
+            ('found (device scroll)', ('id', 'com.example:id/far'), True),
+            ('missing (device scroll)', ('id', 'com.example:id/missing'), True),
+        ):
+            durations, round_trips = [], []
+            for _ in range(repeat):
+                server.swipes = 0
+                seconds, requests = _measure(server, lambda: extended.find_element_on_page(locator, native_scroll=native_scroll))
+                durations.append(seconds)
+                round_trips.append(requests)
+            print(f'{"find_element_on_page " + name:<44} {_ms(statistics.median(durations))} {statistics.median(round_trips):5.0f} round trips')
+    finally:
+        driver.quit()
+
+
+def _tablet_screenshot():
+    from PIL import Image, ImageDraw
+    image = Image.new('RGB', (2048, 1536), 'white')
+    draw = ImageDraw.Draw(image)
+    for y in range(0, 1536, 24):
+        for x in range(0, 2048, 96):
+            draw.text((x, y), f'Label {x * y % 997}', fill=(x % 200, y % 200, 80))
+    output = io.BytesIO()
+    image.save(output, 'PNG')
+    return output.getvalue()
+
+
+def bench_screenshots(repeat):
+    if screenshots.Image is None:
+        print('Pillow is not installed, skipping screenshot transcoding')
+        return
+    png = _tablet_screenshot()
+    print(f'{"captured png 2048x1536":<44} {"":>9} {len(png) / 1024:7.0f} KB')
+    for options in (
+        screenshots.ScreenshotOptions('png', 1280, 75, False, False),
+        screenshots.ScreenshotOptions('jpeg', 1280, 75, False, False),
+        screenshots.ScreenshotOptions('jpeg', 1280, 75, True, False),
+        screenshots.ScreenshotOptions('webp', 1280, 75, False, False),
+        screenshots.ScreenshotOptions('jpeg', 0, 90, False, False),
+    ):
+        seconds = min(timeit.repeat(lambda: screenshots.transcode(png, options), number=1, repeat=repeat))
+        data, extension = screenshots.transcode(png, options)
+        print(f'{"transcode " + options.key:<44} {_ms(seconds)} {len(data) / 1024:7.0f} KB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency_ms', type=float, default=0, help='latency added to every request to the fake server')
+    parser.add_argument('--tests', type=int, default=20, help='tests in the fixture benchmark run')
+    parser.add_argument('--number', type=int, default=20000, help='iterations of the micro-benchmarks')
+    parser.add_argument('--swipes', type=int, default=3, help='swipes before the element looked for appears')
+    args = parser.parse_args()
+
+    with FakeAppiumServer(latency=args.latency_ms / 1000) as server:
+        print(f'-- fake Appium server {server.url} latency {args.latency_ms}ms')
+        bench_fixtures(server, args.tests)
+        bench_proxy(server, args.number)
+        bench_find_element_on_page(server, args.swipes, repeat=5)
+    print('-- report screenshots')
+    bench_screenshots(repeat=5)
+    print('-- UiSelector')
+    uiselector.main(args.number)
+
+
+if __name__ == '__main__':
+    main()
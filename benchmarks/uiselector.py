@@ -0,0 +1,39 @@
+"""
+Micro-benchmarks for the UiSelector python builders.
+
+    python benchmarks/uiselector.py
+"""
+import timeit
+
+from pytest_appium.android.UIAutomator2 import UiSelector, UiScrollable
+
+
+def build_selector():
+    return UiSelector().resourceIdMatches('.*filmstrip_list').childSelector(UiSelector().className('android.view.View').index(1))
+
+
+def build_and_render():
+    return build_selector().build()
+
+
+SELECTOR = build_selector()
+SCROLLABLE = UiScrollable().scrollIntoView(build_selector())
+
+
+BENCHMARKS = {
+    'build selector': build_selector,
+    'build and render selector': build_and_render,
+    'render built selector': lambda: str(SELECTOR),
+    'render built scrollable': lambda: str(SCROLLABLE),
+    'ui_objects': lambda: SCROLLABLE.ui_objects,
+}
+
+
+def main(number=20000):
+    for name, func in BENCHMARKS.items():
+        seconds = min(timeit.repeat(func, number=number, repeat=5))
+        print(f'{name:<30} {seconds / number * 1e6:8.2f} us')
+
+
+if __name__ == '__main__':
+    main()
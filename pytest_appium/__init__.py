@@ -1,11 +1,21 @@
 import os
 
+import pytest
+
 from .conftest import *
+from ._utils import worker_path
+from .device_pool import create_lease_dir, remove_lease_dir
+from .durations import DurationsPlugin, parse_shard
+from .record_replay import stop_record_replay
+from .reset import reset_summary
+from .screenshots import FORMATS as SCREENSHOT_FORMATS, close_screenshot_pipeline
 
 
 def pytest_configure(config):
     if hasattr(config, 'slaveinput'):
         return  # xdist slave
+    create_lease_dir(config)
+    config.pluginmanager.register(DurationsPlugin(config), 'appium_durations')
     # http://doc.pytest.org/en/latest/writing_plugins.html#optionally-using-hooks-from-3rd-party-plugins
     if config.pluginmanager.hasplugin('html'):
             #import pdb ; pdb.set_trace()
@@ -23,6 +33,11 @@ def pytest_configure(config):
         'markers',
         'platform(name): mark test to run only on named mobile platform'
     )
+    config.addinivalue_line(
+        'markers',
+        'appium_reset(strategy): reset app state before this test with one of '
+        '{0}'.format(', '.join(RESET_STRATEGIES))
+    )
 
     # Feature to sleep before a testsuite run
     try:
@@ -34,6 +49,13 @@ def pytest_configure(config):
         pass
 
 
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """xdist: share the device pool lease directory with each worker"""
+    worker_input = getattr(node, 'workerinput', None) or node.slaveinput
+    worker_input['appium_device_pool_dir'] = getattr(node.config, '_appium_device_pool_dir', None)
+
+
 def pytest_addhooks(pluginmanager):
     from . import hooks
     method = getattr(pluginmanager, 'add_hookspecs', None)
@@ -54,13 +76,62 @@ def pytest_addoption(parser):
         help='debug to exclude from capture',
         default=os.getenv('APPIUM_EXCLUDE_DEBUG'),
     )
+    parser.addini(
+        'appium_capture_debug_timeout',
+        help='seconds to wait for debug capture before abandoning the slower gatherers',
+        default=os.getenv('APPIUM_CAPTURE_DEBUG_TIMEOUT', '30'),
+    )
+    parser.addini(
+        'appium_screenshot_format',
+        help='format of report screenshots {0} (transcoding requires Pillow)'.format(tuple(SCREENSHOT_FORMATS)),
+        default=os.getenv('APPIUM_SCREENSHOT_FORMAT', 'jpeg'),
+    )
+    parser.addini(
+        'appium_screenshot_max_dimension',
+        help='downscale report screenshots to fit within this many pixels (0 keeps the captured size)',
+        default=os.getenv('APPIUM_SCREENSHOT_MAX_DIMENSION', '1280'),
+    )
+    parser.addini(
+        'appium_screenshot_quality',
+        help='jpeg/webp quality of report screenshots (1-100)',
+        default=os.getenv('APPIUM_SCREENSHOT_QUALITY', '75'),
+    )
+    parser.addini(
+        'appium_screenshot_grayscale',
+        help='convert report screenshots to grayscale (true/false)',
+        default=os.getenv('APPIUM_SCREENSHOT_GRAYSCALE', 'false'),
+    )
+    parser.addini(
+        'appium_screenshot_keep_original',
+        help='also keep the captured png of transcoded report screenshots (true/false)',
+        default=os.getenv('APPIUM_SCREENSHOT_KEEP_ORIGINAL', 'false'),
+    )
 
     group = parser.getgroup('appium', 'appium')
     group.addoption('--appium_host', metavar='str', default='localhost', help='')
     group.addoption('--appium_port', metavar='str', default='4723', help='')
-    group.addoption('--appium_wait_for_condition', choices=APPIUM_WAIT_FOR.keys(), help='Type of appium condition to wait for before begining first test')
+    group.addoption('--appium_wait_for_condition', choices=APPIUM_WAIT_FOR.keys(), action='append', default=[], help='Type of appium condition to wait for before begining first test (repeat to wait on several conditions together)')
     group.addoption('--appium_wait_for_seconds', type=int, default=0, help='Seconds to wait for an Appium server to become available before raising an error.')
+    group.addoption('--appium_probe_cache_ttl', type=float, default=30, help='Seconds a successful device availability probe is shared between xdist workers (0 disables).')
+    group.addoption('--appium_wait_probe_timeout', type=float, default=10, help='Seconds before a single readiness probe is abandoned.')
     group.addoption('--appium_wait_grace_for_seconds', type=int, default=0, help='Seconds to pause after the GO condition is satisfied.')
+    group.addoption('--appium_pool_size', type=int, default=4, help='Number of keep-alive connections to pool per Appium server (0 disables keep-alive).')
+    group.addoption('--appium_pool_idle_timeout', type=float, default=30, help='Seconds a pooled connection may sit idle before it is dropped and reopened.')
+    group.addoption('--appium_session_pool_size', type=int, default=1, help='Number of live sessions (with different capabilities) to keep for reuse. The least recently used is quit when another is needed.')
+    group.addoption('--appium_durations', metavar='path', help='json file of per-test durations from previous runs, shared between shards (default: the pytest cache).')
+    group.addoption('--appium_shard', metavar='i/N', type=parse_shard, help='Run shard i of N, balanced by the expected duration of the tests.')
+    group.addoption('--appium_xdist_durations', action='store_true', help='Schedule xdist workers longest expected test first, handing out tests as workers finish.')
+    group.addoption('--appium_device_pool', metavar='path', help='json file listing Appium endpoints (host, port, capabilities) to lease to xdist workers.')
+    group.addoption('--appium_device', metavar='host:port', action='append', default=[], dest='appium_devices', help='Appium endpoint to add to the device pool.')
+    group.addoption('--appium_stream_logs', action='store_true', help='Drain device logs in the background and link a per-test log file in the html report.')
+    group.addoption('--appium_log_poll_seconds', type=float, default=2, help='Seconds between background drains of the device logs.')
+    group.addoption('--appium_log_level', choices=('ALL', 'DEBUG', 'INFO', 'WARNING', 'SEVERE'), help='Minimum level of streamed device log entries.')
+    group.addoption('--appium_log_tag', metavar='regex', action='append', default=[], help='Only keep streamed device log entries whose message matches a tag.')
+    group.addoption('--appium_reset', choices=RESET_STRATEGIES.keys(), default='none', help='How app state is reset between tests sharing a session: none, restart (terminate and activate app), clear (clear app data), session (new session).')
+    group.addoption('--appium_instrument', action='store_true', help='Record the latency of every driver command per test and summarise it at the end of the session.')
+    group.addoption('--appium_latency_json', metavar='path', help='Write command latency histograms (per command and per test) to this json file. Implies --appium_instrument.')
+    group.addoption('--appium_record', metavar='path', help='Record the HTTP command/response stream of the Appium sessions to this (gzipped json lines) file.')
+    group.addoption('--appium_replay', metavar='path', help='Serve a file written by --appium_record back to the driver instead of connecting to an Appium server.')
     group.addoption('--appium_debug_app_string_key', metavar='str', action='append', default=[], help='Strings to extract on failure for html report')
     group.addoption(
         '--capability',
@@ -78,8 +149,50 @@ def pytest_addoption(parser):
     )
 
 
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_make_scheduler(config, log):
+    if config.getoption('appium_xdist_durations'):
+        from .xdist_scheduling import DurationScheduling
+        return DurationScheduling(config, log)
+
+
 def pytest_report_header(config, startdir):
     """return a string to be displayed as header info for terminal reporting."""
     capabilities = config.getoption('capabilities')
     if capabilities:
         return 'capabilities: {0}'.format(capabilities)
+
+
+def pytest_terminal_summary(terminalreporter):
+    pool = getattr(terminalreporter.config, '_appium_command_pool', None)
+    if pool is not None:
+        terminalreporter.write_sep('-', pool.summary())
+    shard_summary = getattr(terminalreporter.config, '_appium_shard_summary', None)
+    if shard_summary:
+        terminalreporter.write_line(shard_summary)
+    sessions = getattr(terminalreporter.config, '_appium_sessions', None)
+    if sessions is not None:
+        terminalreporter.write_line(sessions.summary())
+    for line in reset_summary(terminalreporter.config):
+        terminalreporter.write_line(line)
+    command_recorder = getattr(terminalreporter.config, '_appium_command_recorder', None)
+    if command_recorder is not None:
+        terminalreporter.write_sep('-', 'appium command latency')
+        for line in command_recorder.summary_lines():
+            terminalreporter.write_line(line)
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    close_screenshot_pipeline(config)
+    command_recorder = getattr(config, '_appium_command_recorder', None)
+    if command_recorder is not None and config.option.appium_latency_json:
+        command_recorder.write_json(worker_path(config, config.option.appium_latency_json))
+
+
+def pytest_unconfigure(config):
+    remove_lease_dir(config)
+    stop_record_replay(config)
+    pool = getattr(config, '_appium_command_pool', None)
+    if pool is not None:
+        pool.clear()
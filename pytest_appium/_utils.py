@@ -1,34 +1,107 @@
+import codecs
 import json
-import urllib  #.request
+import logging
+import random
 import time
 
+import urllib3
 
-def _decode_response(response):
-    data = response.read()
-    try:
-        encoding = response.info().get_content_charset('utf-8')
-    except AttributeError:
-        encoding = 'utf-8'
-    return json.loads(data.decode(encoding))
-
-
-def get_json(url):
-    return _decode_response(urllib.request.urlopen(url))
-
-
-def post_json(url, data):
-    try:
-        return _decode_response(
-            urllib.request.urlopen(
-                urllib.request.Request(
-                    url,
-                    data=json.dumps(data).encode('utf8'),
-                    headers={'content-type': 'application/json'},
+from .exceptions import HttpStatusError
+
+
+log = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'))
+RETRY_STATUSES = frozenset((502, 503, 504))
+
+
+class HttpClient():
+    """
+    Small JSON over HTTP client for probes and helpers (driver commands go through selenium).
+
+    * persistent (pooled) connections
+    * a timeout on every call
+    * retries with jittered exponential backoff, for idempotent methods only
+    * JSON decoded straight from the response stream rather than a buffered copy of the body
+    """
+
+    def __init__(self, timeout=30, retries=2, backoff_seconds=0.2, maxsize=4):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self._pool_manager = urllib3.PoolManager(maxsize=maxsize, retries=False)
+
+    def _sleep_before_retry(self, attempt):
+        time.sleep(self.backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def request_json(self, method, url, data=None, timeout=None, retries=None, raise_for_status=True):
+        method = method.upper()
+        retries = (self.retries if retries is None else retries) if method in IDEMPOTENT_METHODS else 0
+        body = json.dumps(data).encode('utf8') if data is not None else None
+        headers = {'content-type': 'application/json'} if body is not None else {}
+        for attempt in range(retries + 1):
+            try:
+                response = self._pool_manager.request(
+                    method, url, body=body, headers=headers,
+                    timeout=timeout or self.timeout, preload_content=False,
                 )
-            )
-        )
-    except urllib.error.HTTPError as ex:
-        return _decode_response(ex)
+            except urllib3.exceptions.HTTPError as ex:
+                if attempt >= retries:
+                    raise
+                log.debug(f'{method} {url} failed ({ex}): retrying')
+                self._sleep_before_retry(attempt)
+                continue
+            if response.status in RETRY_STATUSES and attempt < retries:
+                response.release_conn()
+                log.debug(f'{method} {url} returned {response.status}: retrying')
+                self._sleep_before_retry(attempt)
+                continue
+            try:
+                if raise_for_status and response.status >= 400:
+                    raise HttpStatusError(response.status, url)
+                return _decode_response(response)
+            finally:
+                response.release_conn()
+
+    def get_json(self, url, timeout=None, retries=None):
+        return self.request_json('GET', url, timeout=timeout, retries=retries)
+
+    def post_json(self, url, data, timeout=None):
+        """Error responses are decoded and returned rather than raised (Appium reports errors as json)"""
+        return self.request_json('POST', url, data=data, timeout=timeout, raise_for_status=False)
+
+
+def _decode_response(response):
+    content_type = response.headers.get('content-type', '')
+    _, _, charset = content_type.partition('charset=')
+    return json.load(codecs.getreader(charset.split(';')[0].strip() or 'utf-8')(response))
+
+
+http_client = HttpClient()
+
+
+def get_json(url, timeout=None, retries=None):
+    return http_client.get_json(url, timeout=timeout, retries=retries)
+
+
+def post_json(url, data, timeout=None):
+    return http_client.post_json(url, data, timeout=timeout)
+
+
+def derive_bounds(bounds):
+    """
+    Add midpoints and end points to a dict of x, y, width, height
+
+    >>> derive_bounds({'width': 1000, 'height': 1000, 'x': 500, 'y': 500})
+    {'width': 1000, 'height': 1000, 'x': 500, 'y': 500, 'mid_x': 1000.0, 'mid_y': 1000.0, 'end_x': 1499, 'end_y': 1499}
+    """
+    bounds.update({
+        'mid_x': bounds['x'] + bounds['width'] * 0.5,
+        'mid_y': bounds['y'] + bounds['height'] * 0.5,
+        'end_x': bounds['x'] + bounds['width'] - 1,
+        'end_y': bounds['y'] + bounds['height'] - 1,
+    })
+    return bounds
 
 
 def wait_for(
@@ -59,3 +132,35 @@ def wait_for(
             pass
         time.sleep(float(sleep_duration))
     raise func_generate_exception(response)
+
+
+def get_marker(item, name):
+    """
+    The marker `name` closest to `item` (`item.get_marker` was removed in pytest 4.1)
+
+    >>> from unittest.mock import MagicMock
+    >>> get_marker(MagicMock(get_closest_marker=lambda name: name), 'platform')
+    'platform'
+    >>> get_marker(MagicMock(spec=['get_marker'], get_marker=lambda name: name.upper()), 'platform')
+    'PLATFORM'
+    """
+    get_closest_marker = getattr(item, 'get_closest_marker', None)
+    if get_closest_marker is not None:
+        return get_closest_marker(name)
+    return item.get_marker(name)
+
+
+def worker_path(config, path):
+    """
+    `path` suffixed with the xdist worker id so each worker writes its own file
+
+    >>> from unittest.mock import MagicMock
+    >>> worker_path(MagicMock(spec=[]), 'latency.json')
+    'latency.json'
+    >>> worker_path(MagicMock(slaveinput={'slaveid': 'gw1'}), 'latency.json')
+    'latency.json.gw1'
+    """
+    worker_input = getattr(config, 'slaveinput', None)
+    if worker_input:
+        return '{0}.{1}'.format(path, worker_input['slaveid'])
+    return path
@@ -1,5 +1,4 @@
 import copy
-from functools import reduce
 
 try:
     from appium.webdriver.common.mobileby import MobileBy
@@ -12,12 +11,50 @@ https://bitbar.com/how-to-get-started-with-ui-automator-2-0/
 """
 
 
+UISELECTOR_METHODS = (
+    'checkable', 'checked', 'childSelector', 'className', 'classNameMatches', 'clickable',
+    'description', 'descriptionContains', 'descriptionMatches', 'descriptionStartsWith',
+    'enabled', 'focusable', 'focused', 'fromParent', 'index', 'instance', 'longClickable',
+    'packageName', 'packageNameMatches', 'resourceId', 'resourceIdMatches', 'scrollable', 'selected',
+    'text', 'textContains', 'textMatches', 'textStartsWith',
+)
+UISCROLLABLE_METHODS = (
+    'flingBackward', 'flingForward', 'flingToBeginning', 'flingToEnd',
+    'getChildByDescription', 'getChildByInstance', 'getChildByText',
+    'scrollBackward', 'scrollDescriptionIntoView', 'scrollForward', 'scrollIntoView', 'scrollTextIntoView',
+    'scrollToBeginning', 'scrollToEnd', 'setAsHorizontalList', 'setAsVerticalList',
+    'setMaxSearchSwipes', 'setSwipeDeadZonePercentage',
+)
+UICOLLECTION_METHODS = (
+    'getChildByDescription', 'getChildByInstance', 'getChildByText', 'getChildCount',
+)
+
+
+def _builder_methods(*method_names):
+    """Class decorator generating an explicit builder method for each java method name"""
+    def _builder_method(method_name):
+        def _method(self, *args):
+            return self._add_segment(method_name, args)
+        _method.__name__ = _method.__qualname__ = method_name
+        return _method
+
+    def _decorator(cls):
+        for method_name in method_names:
+            setattr(cls, method_name, _builder_method(method_name))
+        return cls
+    return _decorator
+
+
 class _PythonUIAutomatorBuilderMixin():
     """
     Designed to be used as Mixin.
     The example below is a raw unmodified output.
     See other examples for actual use cases.
 
+    Known java methods are generated as explicit methods (see `_builder_methods`).
+    Any other method name is still accepted as a segment.
+    The rendered string is cached and invalidated when this builder (or any nested builder) is modified.
+
     >>> str(_PythonUIAutomatorBuilderMixin().text('moose'))
     '.text("moose")'
 
@@ -35,37 +72,82 @@ class _PythonUIAutomatorBuilderMixin():
     1
     >>> str(selector.ui_objects[0])
     '.childText("more")'
+    >>> str(selector.ui_objects[0].index(2))
+    '.childText("more").index(2)'
+    >>> str(selector)
+    '.text("moose").child(.childText("more").index(2))'
     """
+    __slots__ = ('segments', '_rendered', '_parents')
+
+    # method_name -> name of the method used to preprocess the args of that segment
+    PREPROCESSORS = {}
 
     def __init__(self):
         self.segments = {}  # Python3.6 guarantees dict iteration in insertion order
-        self.PREPROCESSORS = {}
+        self._rendered = None
+        self._parents = []
 
     def __copy__(self):
-        _new = type(self)()
-        _new.segments.update(self.segments)
-        _new.PREPROCESSORS.update(self.PREPROCESSORS)
+        _new = self._new_instance()
+        for method_name, args in self.segments.items():
+            _new._add_segment(method_name, args)
         return _new
 
     def __deepcopy__(self, memo):
-        _new = type(self)()
-        _new.segments = copy.deepcopy(self.segments, memo)
-        _new.PREPROCESSORS = copy.deepcopy(self.PREPROCESSORS, memo)
+        _new = self._new_instance()
+        for method_name, args in self.segments.items():
+            _new._add_segment(method_name, copy.deepcopy(args, memo))
         return _new
 
+    def _new_instance(self):
+        return type(self)()
+
+    def __getattr__(self, method_name):
+        """
+        Use the 'builder' pattern to construct a 'java' command from any other 'python' method name
+        """
+        if method_name.startswith('_'):
+            raise AttributeError(method_name)
+        def _add_segment(*args):
+            return self._add_segment(method_name, args)
+        return _add_segment
+
+    def _add_segment(self, method_name, args):
+        for arg in args:
+            if isinstance(arg, _PythonUIAutomatorBuilderMixin):
+                arg._parents.append(self)
+        self.segments[method_name] = args
+        self._invalidate()
+        return self
+
+    def _invalidate(self):
+        if self._rendered is not None:
+            self._rendered = None
+            for parent in self._parents:
+                parent._invalidate()
+
     def __str__(self):
+        if self._rendered is None:
+            self._rendered = self._render()
+        return self._rendered
+
+    def _render(self):
         # Should be overridden
         return self._render_args()
 
     @property
     def ui_objects(self):
-        def _reduce_ui_objects(acc, args):
+        ui_objects = []
+        for args in self.segments.values():
             for arg in args:
                 if isinstance(arg, _PythonUIAutomatorBuilderMixin):
-                    acc.append(arg)
-                    acc.extend(arg.ui_objects)
-            return acc
-        return reduce(_reduce_ui_objects, self.segments.values(), [])
+                    ui_objects.append(arg)
+                    ui_objects.extend(arg.ui_objects)
+        return ui_objects
+
+    def preprocess(self, method_name, arg):
+        preprocessor = self.PREPROCESSORS.get(method_name)
+        return getattr(self, preprocessor)(arg) if preprocessor else arg
 
     def _render_args(self):
         return ''.join(self._render_arg(method_name, arg) for method_name, arg in self.segments.items())
@@ -75,7 +157,7 @@ class _PythonUIAutomatorBuilderMixin():
         Special processors for some methods else fallthough string
         """
         def _format_arg_as_java_string(arg):
-            #if arg.__class__.__name__ == UiSelector.__name__:
+            arg = self.preprocess(method_name, arg)
             if isinstance(arg, _PythonUIAutomatorBuilderMixin):
                 return str(arg)
             if isinstance(arg, str):
@@ -86,27 +168,13 @@ class _PythonUIAutomatorBuilderMixin():
                 return str(arg)
             raise Exception(f'unknown arg type to build java uiselector {args}')
 
-        def _preprocess_arg(arg):
-            return self.PREPROCESSORS.get(method_name, lambda x: x)(arg)
-
-        return f'''.{method_name}({', '.join(map(_format_arg_as_java_string, map(_preprocess_arg, args)))})'''
-
-    def __getattribute__(self, method_name):
-        """
-        Use the 'builder' pattern to construct a 'java' command from 'python' object access
-        """
-        try:
-            return super().__getattribute__(method_name)
-        except AttributeError as ae:
-            def _add_segment(*args):
-                self.segments[method_name] = args
-                return self
-            return _add_segment
+        return f'''.{method_name}({', '.join(map(_format_arg_as_java_string, args))})'''
 
     def build(self):
-        return (MobileBy.ANDROID_UIAUTOMATOR, self.__str__())
+        return (MobileBy.ANDROID_UIAUTOMATOR, str(self))
 
 
+@_builder_methods(*UISELECTOR_METHODS)
 class UiSelector(_PythonUIAutomatorBuilderMixin):
     """
     https://developer.android.com/reference/android/support/test/uiautomator/UiSelector.html
@@ -130,25 +198,56 @@ class UiSelector(_PythonUIAutomatorBuilderMixin):
     >>> UiSelector().childSelector(UiSelector().className('test')).build()
     ('-android uiautomator', 'new UiSelector().childSelector(new UiSelector().className("test"))')
     """
+    __slots__ = ('app_package', )
+
+    PREPROCESSORS = {
+        'resourceId': '_augment_resourceId',
+    }
 
     def __init__(self, app_package=None):
         _PythonUIAutomatorBuilderMixin.__init__(self)
-
         self.app_package = app_package
 
-        def _augment_resourceId(resource_id):
-            if self.app_package and not resource_id.startswith(self.app_package):
-                return f'''{app_package}:id/{resource_id}'''
-            return resource_id
-        self.PREPROCESSORS = {
-            'resourceId': _augment_resourceId,
-        }
+    def _new_instance(self):
+        return type(self)(app_package=self.app_package)
 
-    def __str__(self):
+    def _augment_resourceId(self, resource_id):
+        if self.app_package and not resource_id.startswith(self.app_package):
+            return f'''{self.app_package}:id/{resource_id}'''
+        return resource_id
+
+    def _render(self):
         return f'''new UiSelector(){self._render_args()}'''
 
 
-class UiScrollable(_PythonUIAutomatorBuilderMixin):
+class _ContainerBuilderMixin(_PythonUIAutomatorBuilderMixin):
+    """Builders wrapping a container UiSelector: `new Ui<Name>(container)`"""
+    __slots__ = ('_uiselector_container', )
+
+    @property
+    def uiselector_container(self):
+        return self._uiselector_container
+
+    @uiselector_container.setter
+    def uiselector_container(self, uiselector_container):
+        uiselector_container._parents.append(self)
+        self._uiselector_container = uiselector_container
+        self._invalidate()
+
+    def _new_instance(self):
+        return type(self)(self.uiselector_container)
+
+    def __deepcopy__(self, memo):
+        _new = super().__deepcopy__(memo)
+        _new.uiselector_container = copy.deepcopy(self.uiselector_container, memo)
+        return _new
+
+    def _render(self):
+        return f'''new {type(self).__name__}({self.uiselector_container}){self._render_args()}'''
+
+
+@_builder_methods(*UISCROLLABLE_METHODS)
+class UiScrollable(_ContainerBuilderMixin):
     """
     https://developer.android.com/reference/android/support/test/uiautomator/UiScrollable.html
 
@@ -157,16 +256,15 @@ class UiScrollable(_PythonUIAutomatorBuilderMixin):
     ... )
     'new UiScrollable(new UiSelector().className("container")).scrollTextIntoView("My Title")'
     """
+    __slots__ = ()
 
     def __init__(self, uiselector_container=None):
         _PythonUIAutomatorBuilderMixin.__init__(self)
         self.uiselector_container = uiselector_container or UiSelector().className('android.widget.ScrollView')
 
-    def __str__(self):
-        return f'''new UiScrollable({self.uiselector_container}){self._render_args()}'''
-
 
-class UiCollection(_PythonUIAutomatorBuilderMixin):
+@_builder_methods(*UICOLLECTION_METHODS)
+class UiCollection(_ContainerBuilderMixin):
     """
     https://developer.android.com/reference/android/support/test/uiautomator/UiCollection.html
 
@@ -175,10 +273,8 @@ class UiCollection(_PythonUIAutomatorBuilderMixin):
     ... )
     'new UiCollection(new UiSelector().className("container")).getChildByInstance(new UiSelector(), 2)'
     """
+    __slots__ = ()
 
     def __init__(self, uiselector_container=None):
         _PythonUIAutomatorBuilderMixin.__init__(self)
         self.uiselector_container = uiselector_container or UiSelector().className('android.support.v7.widget.RecyclerView')
-
-    def __str__(self):
-        return f'''new UiCollection({self.uiselector_container}){self._render_args()}'''
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import threading
+
+
+class ArtifactStore():
+    """
+    Content addressed store for report artifacts (screenshots, page sources, app_strings).
+
+    Each blob is written once under it's sha256 alongside the html report.
+    Identical blobs (e.g. the same screen captured by several tests) are stored once.
+    Callers keep only the returned path (relative to the report) so payloads can be freed immediately.
+
+    >>> import tempfile
+    >>> store = ArtifactStore(tempfile.mkdtemp())
+    >>> store.put(b'<hierarchy/>', 'xml')
+    'appium/artifacts/61578849fa1e5513034da0dabee5bf12ab701e08f9ee69d1164988a2b0b5064e.xml'
+    >>> store.put('<hierarchy/>', 'xml') == store.put(b'<hierarchy/>', 'xml')
+    True
+    >>> len(os.listdir(os.path.join(store.report_dir, 'appium', 'artifacts')))
+    1
+    """
+
+    def __init__(self, report_dir, folder='appium/artifacts'):
+        self.report_dir = report_dir
+        self.folder = folder
+        os.makedirs(os.path.join(report_dir, folder), exist_ok=True)
+
+    def path(self, digest, extension):
+        return '{0}/{1}.{2}'.format(self.folder, digest, extension)
+
+    def exists(self, path):
+        return os.path.exists(os.path.join(self.report_dir, path))
+
+    def write(self, path, data):
+        """Write `data` (bytes) to `path` (relative to the report directory) unless it already exists"""
+        absolute_path = os.path.join(self.report_dir, path)
+        if not os.path.exists(absolute_path):
+            # Write then rename so concurrent writers (threads, xdist workers) never expose a partial file
+            temp_path = '{0}.{1}.{2}.tmp'.format(absolute_path, os.getpid(), threading.get_ident())
+            with open(temp_path, 'wb') as filehandle:
+                filehandle.write(data)
+            os.replace(temp_path, absolute_path)
+
+    def put(self, data, extension):
+        """Store `data` (bytes or str) and return it's path relative to the report directory"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        path = self.path(hashlib.sha256(data).hexdigest(), extension)
+        self.write(path, data)
+        return path
+
+
+def report_dir(config):
+    """Directory of the html report (shared artifacts are written alongside it)"""
+    htmlpath = config.getoption('htmlpath', None)
+    if htmlpath:
+        return os.path.dirname(os.path.abspath(htmlpath))
+
+
+def get_artifact_store(config):
+    """Return the session `ArtifactStore` (or None when no html report directory is set)"""
+    if not hasattr(config, '_appium_artifact_store'):
+        _report_dir = report_dir(config)
+        config._appium_artifact_store = ArtifactStore(_report_dir) if _report_dir else None
+    return config._appium_artifact_store
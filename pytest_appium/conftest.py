@@ -1,19 +1,27 @@
 import logging
 import copy
-from datetime import datetime
 import os
 import sys
 import urllib.error
 import time
-import datetime
 from functools import partial
 from itertools import filterfalse
 
 import pytest
 from appium import webdriver
 
-from ._utils import get_json, post_json
-from .driver.proxy.proxy_mixin import proxy
+from ._utils import get_json, get_marker, post_json
+from .device_pool import get_device_pool
+from .durations import expected_durations, load_durations, shard_nodeids
+from .driver.command_pool import attach_command_pool
+from .driver.instrumentation import get_command_recorder, instrument_driver
+from .log_collector import start_log_collector, stop_log_collector
+from .probe_cache import cache_probes
+from .readiness import wait_until_ready
+from .record_replay import get_replay_server, record_driver
+from .reset import RESET_STRATEGIES, reset_driver, reset_strategy
+from .session_pool import SessionPool, capabilities_key
+from .driver.proxy.proxy_mixin import DEFAULT_REGISTRATION_NAME, proxy, reset_proxy
 from .driver.proxy import appium_extensions
 from .driver.proxy import android_extensions
 from .driver.proxy import ios_extensions
@@ -49,31 +57,27 @@ def session_capabilities(request, variables):
     return capabilities
 
 
-@pytest.fixture
-def driver_kwargs(request, capabilities):
-    """ """
+def _driver_kwargs(request, capabilities):
     # Assertions of capabilitys should go here
     #appium_user = f'{0.appium_username}:{0.appium_access_key}@'
+    replay_server = get_replay_server(request.config)
     kwargs = dict(
-        command_executor='http://{0.appium_host}:{0.appium_port}/wd/hub'.format(request.config.option),
+        command_executor=replay_server.url if replay_server else 'http://{0.appium_host}:{0.appium_port}/wd/hub'.format(request.config.option),
         desired_capabilities=capabilities,
         browser_profile=None,
         proxy=None,
-        keep_alive=False,
+        keep_alive=bool(request.config.option.appium_pool_size),
     )
     return kwargs
 
 
-@pytest.fixture
-def driver_class(request):
-    """Appium driver class"""
-    return webdriver.Remote
-
-
-@pytest.yield_fixture
-def driver(request, driver_class, driver_kwargs):
-    """Returns a AppiumDriver instance based on options and capabilities"""
+def _driver(request, driver_class, driver_kwargs):
     driver = driver_class(**driver_kwargs)
+    driver._appium_desired_capabilities = driver_kwargs['desired_capabilities']
+    record_driver(driver, request.config)
+    attach_command_pool(driver, request.config)
+    instrument_driver(driver, request.config)
+    log_collector = start_log_collector(driver, request)
 
     #event_listener = request.config.getoption('event_listener')
     #if event_listener is not None:
@@ -86,10 +90,32 @@ def driver(request, driver_class, driver_kwargs):
 
     request.node._driver = driver
     yield driver
+    if log_collector:
+        stop_log_collector(log_collector, request.config)
     driver.quit()
 
 
-def _appium_is_device_available(appium_wd_api_endpoint, desiredCapabilities={}, appNameKey=''):
+# The fixtures below delegate to plain functions; pytest >= 4 does not allow calling fixtures directly
+
+@pytest.fixture
+def driver_kwargs(request, capabilities):
+    """ """
+    return _driver_kwargs(request, capabilities)
+
+
+@pytest.fixture
+def driver_class(request):
+    """Appium driver class"""
+    return webdriver.Remote
+
+
+@pytest.yield_fixture
+def driver(request, driver_class, driver_kwargs):
+    """Returns a AppiumDriver instance based on options and capabilities"""
+    yield from _driver(request, driver_class, driver_kwargs)
+
+
+def _appium_is_device_available(appium_wd_api_endpoint, desiredCapabilities={}, appNameKey='', timeout=None):
     """
     Problem:
         We cant ask appium how many devices are attacked from it's 'wd' api.
@@ -106,6 +132,7 @@ def _appium_is_device_available(appium_wd_api_endpoint, desiredCapabilities={},
     response = post_json(
         url=f'''{appium_wd_api_endpoint}/session''',
         data={"desiredCapabilities": desiredCapabilities},
+        timeout=timeout,
     )
     return desiredCapabilities[appNameKey] in response.get('value', {}).get('message', '')
 
@@ -132,58 +159,122 @@ appium_is_device_available_ios = partial(
 )
 
 APPIUM_WAIT_FOR = {
-    'appium': lambda appium_url: get_json(f"""{appium_url}/status""").get('value').get('build').get('version'),
+    'appium': lambda appium_url, timeout=None: get_json(f"""{appium_url}/status""", timeout=timeout, retries=0).get('value').get('build').get('version'),
     'android_device_available': appium_is_device_available_android,
-    #'ios_device_available': appium_is_device_available_ios,
+    'ios_device_available': appium_is_device_available_ios,
 }
 
+# Probes that start a real session on the device; their result is shared between xdist workers
+APPIUM_WAIT_FOR_SHARED = ('android_device_available', 'ios_device_available')
+
+def _wait_for_appium(request, appium_url):
+    """Wait for the Appium server (once per server url)"""
+    ready_urls = request.config.__dict__.setdefault('_appium_ready_urls', set())
+    wait_for_conditions = request.config.option.appium_wait_for_condition
+    seconds_to_wait = request.config.option.appium_wait_for_seconds
+    if not seconds_to_wait or not wait_for_conditions or request.config.option.appium_replay or appium_url in ready_urls:
+        return
+    assert all(condition in APPIUM_WAIT_FOR for condition in wait_for_conditions)
+    wait_until_ready(
+        appium_url,
+        probes=cache_probes(APPIUM_WAIT_FOR, APPIUM_WAIT_FOR_SHARED, ttl=request.config.option.appium_probe_cache_ttl),
+        conditions=wait_for_conditions,
+        seconds_to_wait=seconds_to_wait,
+        probe_timeout=request.config.option.appium_wait_probe_timeout,
+    )
+    log.debug('Appium (apparently) ready: Waiting for further grace period')
+    time.sleep(request.config.option.appium_wait_grace_for_seconds)
+    ready_urls.add(appium_url)
+
+
+def _start_session(request, capabilities):
+    """
+    Start a driver session with `capabilities`, yield it, and quit it when resumed.
+    (generator for `SessionPool`)
+    """
+    # A replayed session is served locally, so no device is leased
+    device_pool = None if request.config.option.appium_replay else get_device_pool(request.config)
+    if device_pool is None:
+        kwargs = _driver_kwargs(request, capabilities)
+        appium_url = kwargs['command_executor']
+        _wait_for_appium(request, appium_url)
+        try:
+            yield from _driver(request, webdriver.Remote, kwargs)
+        except urllib.error.URLError:
+            raise Exception(f"""Unable to connect to Appium server {appium_url}""")
+        return
+
+    # Lease a free endpoint from the device pool. Endpoints whose device is dead are
+    # marked as such and the next free endpoint is leased in their place.
+    while True:
+        endpoint = device_pool.lease()
+        kwargs = _driver_kwargs(request, {**capabilities, **endpoint.capabilities})
+        kwargs['command_executor'] = endpoint.url
+        session = _driver(request, webdriver.Remote, kwargs)
+        try:
+            _wait_for_appium(request, endpoint.url)
+            driver_instance = next(session)
+        except Exception as ex:
+            log.warning(f'Unable to start session on Appium server {endpoint.url}: {ex}')
+            device_pool.mark_dead(endpoint)
+            continue
+        break
+    try:
+        yield driver_instance
+        next(session, None)  # driver teardown
+    finally:
+        device_pool.release(endpoint)
+
+
+def effective_capabilities(item, session_capabilities):
+    """
+    Session capabilities overlaid with the `capabilities` marker of the test
+
+        @pytest.mark.capabilities(language='fr', locale='FR')
+        def test_french(appium):
+            pass
+    """
+    capabilities_marker = get_marker(item, 'capabilities')
+    if not capabilities_marker or not capabilities_marker.kwargs:
+        return session_capabilities
+    return {**session_capabilities, **capabilities_marker.kwargs}
+
+
 @pytest.yield_fixture(scope='session')
-def driver_session_(request, session_capabilities):
+def appium_sessions(request):
+    """
+    Live Appium sessions of the test run keyed by capabilities.
+    Up to --appium_session_pool_size sessions are kept; a test with other capabilities replaces the least recently used.
+    """
+    sessions = SessionPool(partial(_start_session, request), maxsize=request.config.option.appium_session_pool_size)
+    request.config._appium_sessions = sessions
+    yield sessions
+    sessions.close()
+
+
+@pytest.fixture(scope='session')
+def driver_session_(appium_sessions, session_capabilities):
     """
     Appium Session
     Created from --capabilities
     (do not use this fixture directly as report screenshots will not function)
     """
-    _driver_class = driver_class(request)
-    _driver_kwargs = driver_kwargs(request, session_capabilities)
-
-    appium_url = _driver_kwargs['command_executor']
-
-    # Wait for Appium
-    def wait_for_appium():
-        wait_for_condition = request.config.option.appium_wait_for_condition
-        seconds_to_wait = request.config.option.appium_wait_for_seconds
-        if not seconds_to_wait or not wait_for_condition:
-            return
-        assert wait_for_condition in APPIUM_WAIT_FOR
-        expire_datetime = datetime.datetime.now() + datetime.timedelta(seconds=seconds_to_wait)
-        while datetime.datetime.now() <= expire_datetime:
-            try:
-                if APPIUM_WAIT_FOR[wait_for_condition](appium_url):
-                    log.debug('Android Device (apparently) ready: Waiting for further grace period')
-                    time.sleep(request.config.option.appium_wait_grace_for_seconds)
-                    return
-            except Exception:
-                pass
-            log.debug(f'Waiting on {wait_for_condition} for {seconds_to_wait} for Appium server{appium_url}')
-            time.sleep(2)
-        raise Exception(f'Server not ready. Failed to wait on {wait_for_condition} for {seconds_to_wait} seconds for Appium server {appium_url}')
-    wait_for_appium()
-
-    try:
-        yield from driver(request, _driver_class, _driver_kwargs)
-    except urllib.error.URLError:
-        raise Exception(f"""Unable to connect to Appium server {appium_url}""")
+    return appium_sessions.get(session_capabilities)
 
 
 @pytest.yield_fixture
-def driver_session(request, driver_session_):
+def driver_session(request, appium_sessions, session_capabilities):
     """
     Appium Session
+    Created from --capabilities and the `capabilities(kwargs)` marker of the test
+    App state is reset between tests with --appium_reset or the `appium_reset(strategy)` marker
     """
+    driver_session_ = appium_sessions.get(effective_capabilities(request.node, session_capabilities))
+    if getattr(driver_session_, '_appium_used', False):
+        reset_driver(driver_session_, reset_strategy(request.node), request.config)
+    driver_session_._appium_used = True
     request.node._driver = driver_session_  # Required to facilitate screenshots in html reports
     yield driver_session_
-    #driver_session_.reset()
 
 
 @pytest.yield_fixture
@@ -194,11 +285,36 @@ def appium(driver_session):
 
 @pytest.fixture
 def appium_extended(appium):
-    appium = proxy(appium)  # Apply generic mixins over appium
-    appium = proxy(appium, appium.platform)  # Apply platform specific mixins
-    return appium
+    """
+    appium driver with generic and platform specific mixins applied.
+    The proxy is built once per driver session and reused; `reset_proxy` resets per-test mixin state.
+    """
+    appium_extended = getattr(appium, '_appium_extended', None)
+    if appium_extended is None:
+        platform = appium_extensions.PlatformShortcutMixin.platform.fget(appium)
+        appium_extended = proxy(appium, DEFAULT_REGISTRATION_NAME, platform)
+        appium._appium_extended = appium_extended
+    reset_proxy(appium_extended)
+    return appium_extended
 
 
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    """Mark the start of this test in the streamed device logs and command latencies"""
+    for log_collector in getattr(item.config, '_appium_log_collectors', ()):
+        log_collector.begin_test(item.nodeid)
+    command_recorder = get_command_recorder(item.config)
+    if command_recorder is not None:
+        command_recorder.nodeid = item.nodeid
+
+
+def _capabilities_group(item):
+    """Key of the capabilities a test adds with the `capabilities` marker"""
+    capabilities_marker = get_marker(item, 'capabilities')
+    return capabilities_key(capabilities_marker.kwargs if capabilities_marker else {})
+
+
+@pytest.hookimpl(tryfirst=True)  # before xdist reads the xdist_group markers
 def pytest_collection_modifyitems(config, items):
     """
     https://docs.pytest.org/en/latest/example/markers.html#custom-marker-and-command-line-option-to-control-test-runs
@@ -208,12 +324,20 @@ def pytest_collection_modifyitems(config, items):
         @pytest.mark.platform('android')
         def test_example():
             pass
+
+    Group tests by capabilities marker:
+        Tests are ordered so that tests sharing capabilities run together (groups in order of their
+        first test) and each set of capabilities starts its session once.
+        With pytest-xdist each group is marked `xdist_group`, so with `--dist loadgroup` (pytest-xdist >= 2.5)
+        each group runs on one worker. Other `--dist` modes ignore the marker.
+
+    Shard by expected duration (--appium_shard i/N) and order tests longest first for --appium_xdist_durations.
     """
 
     # Filter tests that are not targeted for this platform
     current_platform = config._variables.get('capabilities',{}).get('platformName','').lower()
     def select_test(item):
-        platform_marker = item.get_marker("platform")
+        platform_marker = get_marker(item, "platform")
         if platform_marker and platform_marker.args and current_platform:
             test_platform_specified = platform_marker.args[0].lower()
             if test_platform_specified != current_platform:
@@ -221,3 +345,26 @@ def pytest_collection_modifyitems(config, items):
         return True
     config.hook.pytest_deselected(items=filterfalse(select_test, items))
     items[:] = filter(select_test, items)
+
+    xdist_durations = config.option.appium_xdist_durations and hasattr(config, 'slaveinput')
+    if config.option.appium_shard or xdist_durations:
+        expected = expected_durations([item.nodeid for item in items], load_durations(config))
+    if config.option.appium_shard:
+        index, count = config.option.appium_shard
+        shard = set(shard_nodeids(expected, count)[index])
+        config.hook.pytest_deselected(items=[item for item in items if item.nodeid not in shard])
+        items[:] = [item for item in items if item.nodeid in shard]
+        config._appium_shard_summary = f'appium shard {index + 1}/{count}: {len(items)} tests, {sum(expected[item.nodeid] for item in items):.1f}s expected'
+
+    groups = {}
+    for item in items:
+        groups.setdefault(_capabilities_group(item), []).append(item)
+    items[:] = [item for group in groups.values() for item in group]
+    if config.pluginmanager.hasplugin('xdist'):
+        for group, group_items in groups.items():
+            for item in group_items:
+                item.add_marker(pytest.mark.xdist_group(name=f'appium_capabilities_{group}'))
+
+    if xdist_durations:
+        # Longest first for DurationScheduling
+        items.sort(key=lambda item: -expected[item.nodeid])
@@ -0,0 +1,195 @@
+import errno
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+from collections import namedtuple
+
+from .exceptions import DevicePoolExhausted
+
+
+log = logging.getLogger(__name__)
+
+DEAD_SUFFIX = '.dead'
+LEASE_SUFFIX = '.lease'
+
+
+class Endpoint(namedtuple('Endpoint', ('host', 'port', 'capabilities'))):
+    """
+    An Appium server with the capabilities of the device attached to it.
+
+    >>> endpoint = Endpoint.parse('emulator-1:4725')
+    >>> endpoint.url
+    'http://emulator-1:4725/wd/hub'
+    >>> endpoint.id
+    'emulator-1_4725'
+    >>> Endpoint.parse({'host': 'emulator-2', 'capabilities': {'udid': 'emulator-5556'}})
+    Endpoint(host='emulator-2', port='4723', capabilities={'udid': 'emulator-5556'})
+    """
+
+    @classmethod
+    def parse(cls, data):
+        if isinstance(data, str):
+            host, _, port = data.partition(':')
+            data = {'host': host, 'port': port}
+        return cls(
+            host=data['host'],
+            port=str(data.get('port') or '4723'),
+            capabilities=data.get('capabilities', {}),
+        )
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/wd/hub'
+
+    @property
+    def id(self):
+        return f'{self.host}_{self.port}'
+
+
+def load_endpoints(config):
+    """
+    Endpoints from `--appium_device_pool` (a json list of endpoints) and `--appium_device host:port`
+
+    Example device pool file:
+        [
+            {"host": "emulator-1", "port": 4723, "capabilities": {"udid": "emulator-5554"}},
+            {"host": "emulator-2", "port": 4723, "capabilities": {"udid": "emulator-5556"}}
+        ]
+    """
+    endpoints = []
+    device_pool_file = config.getoption('appium_device_pool')
+    if device_pool_file:
+        with open(device_pool_file) as filehandle:
+            endpoints.extend(map(Endpoint.parse, json.load(filehandle)))
+    endpoints.extend(map(Endpoint.parse, config.getoption('appium_devices')))
+    return endpoints
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as ex:
+        return ex.errno == errno.EPERM
+    return True
+
+
+class DevicePool():
+    """
+    Lease endpoints to pytest-xdist workers.
+
+    Leases are files created with O_EXCL in a directory shared by all workers of a run.
+    A lease left behind by a worker process that no longer exists is reclaimed.
+    An endpoint whose device has died is marked dead and is never leased again in this run.
+
+    >>> directory = tempfile.mkdtemp()
+    >>> pool_a = DevicePool(map(Endpoint.parse, ('a:1', 'b:2')), directory, owner='gw0')
+    >>> pool_b = DevicePool(map(Endpoint.parse, ('a:1', 'b:2')), directory, owner='gw1')
+    >>> pool_a.lease().id, pool_b.lease().id
+    ('a_1', 'b_2')
+    >>> pool_b.mark_dead(Endpoint.parse('b:2'))
+    >>> pool_b.lease()
+    Traceback (most recent call last):
+    ...
+    pytest_appium.exceptions.DevicePoolExhausted: No free Appium endpoint for gw1 (1 leased, 1 dead)
+    >>> pool_a.release(Endpoint.parse('a:1'))
+    >>> pool_b.lease().id
+    'a_1'
+    >>> shutil.rmtree(directory)
+    """
+
+    def __init__(self, endpoints, lease_dir, owner='master'):
+        self.endpoints = tuple(endpoints)
+        self.lease_dir = lease_dir
+        self.owner = owner
+
+    def _path(self, endpoint, suffix):
+        return os.path.join(self.lease_dir, endpoint.id + suffix)
+
+    def is_dead(self, endpoint):
+        return os.path.exists(self._path(endpoint, DEAD_SUFFIX))
+
+    def _try_acquire(self, endpoint):
+        path = self._path(endpoint, LEASE_SUFFIX)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not self._reclaim_stale(path):
+                return False
+            return self._try_acquire(endpoint)
+        with os.fdopen(fd, 'w') as filehandle:
+            json.dump({'owner': self.owner, 'pid': os.getpid(), 'hostname': socket.gethostname()}, filehandle)
+        return True
+
+    def _reclaim_stale(self, path):
+        try:
+            with open(path) as filehandle:
+                holder = json.load(filehandle)
+        except (OSError, ValueError):
+            return False  # Lease is being written or was just released; not ours to take
+        if holder.get('hostname') != socket.gethostname() or _pid_alive(holder.get('pid')):
+            return False
+        log.warning(f'Reclaiming stale lease {path} held by {holder}')
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def lease(self):
+        for endpoint in self.endpoints:
+            if self.is_dead(endpoint):
+                continue
+            if self._try_acquire(endpoint):
+                log.info(f'{self.owner} leased Appium endpoint {endpoint.url}')
+                return endpoint
+        dead = sum(map(self.is_dead, self.endpoints))
+        raise DevicePoolExhausted(
+            f'No free Appium endpoint for {self.owner} ({len(self.endpoints) - dead} leased, {dead} dead)'
+        )
+
+    def release(self, endpoint):
+        try:
+            os.remove(self._path(endpoint, LEASE_SUFFIX))
+        except FileNotFoundError:
+            pass
+
+    def mark_dead(self, endpoint):
+        log.warning(f'{self.owner} marking Appium endpoint {endpoint.url} as dead')
+        with open(self._path(endpoint, DEAD_SUFFIX), 'w') as filehandle:
+            filehandle.write(self.owner)
+        self.release(endpoint)
+
+
+def _worker_input(config):
+    return getattr(config, 'workerinput', None) or getattr(config, 'slaveinput', None)
+
+
+def create_lease_dir(config):
+    """Called on the xdist controller (or a non-distributed run) to create the shared lease directory"""
+    if load_endpoints(config):
+        config._appium_device_pool_dir = tempfile.mkdtemp(prefix='pytest_appium_device_pool_')
+
+
+def remove_lease_dir(config):
+    lease_dir = getattr(config, '_appium_device_pool_dir', None)
+    if lease_dir:
+        shutil.rmtree(lease_dir, ignore_errors=True)
+
+
+def get_device_pool(config):
+    """Return the `DevicePool` for this process (or None when no device pool is configured)"""
+    if hasattr(config, '_appium_device_pool'):
+        return config._appium_device_pool
+    endpoints = load_endpoints(config)
+    worker_input = _worker_input(config)
+    if worker_input is not None:
+        lease_dir = worker_input.get('appium_device_pool_dir')
+        owner = worker_input.get('workerid') or worker_input.get('slaveid')
+    else:
+        lease_dir = getattr(config, '_appium_device_pool_dir', None)
+        owner = 'master'
+    config._appium_device_pool = DevicePool(endpoints, lease_dir, owner) if endpoints and lease_dir else None
+    return config._appium_device_pool
@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+import urllib3
+
+
+log = logging.getLogger(__name__)
+
+
+class CommandPool():
+    """
+    Keep-alive HTTP pool shared by every driver command executor in the session.
+
+    selenium's `RemoteConnection` sends each command through `self._conn.request(...)`
+    when `keep_alive` is enabled. We swap `_conn` for this object so all drivers
+    (session and function scoped) reuse the same persistent connections.
+
+    Connections that have been idle longer than `idle_timeout` seconds are dropped
+    before the next request rather than risking a socket the server has already closed.
+
+    >>> pool = CommandPool(maxsize=2, idle_timeout=30)
+    >>> pool.stats()
+    {'requests': 0, 'connections': 0, 'reused': 0, 'idle_resets': 0}
+    >>> pool.summary()
+    'appium command pool: 0 requests over 0 connections (0 reused, 0.0%), 0 idle resets'
+    """
+
+    def __init__(self, maxsize=4, idle_timeout=30, timeout=None):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._last_used = None
+        self._retired = {'requests': 0, 'connections': 0}
+        self._idle_resets = 0
+        self._new_manager()
+
+    def _new_manager(self):
+        self._manager = urllib3.PoolManager(maxsize=self.maxsize, timeout=self._timeout)
+        self._pools = {}
+
+    def _expire_idle(self):
+        now = time.monotonic()
+        if self._last_used is not None and self.idle_timeout and now - self._last_used > self.idle_timeout:
+            log.debug(f'Appium command pool idle for more than {self.idle_timeout}s: dropping connections')
+            self._retire()
+            self._idle_resets += 1
+        self._last_used = now
+
+    def _retire(self):
+        for pool in self._pools.values():
+            self._retired['requests'] += pool.num_requests
+            self._retired['connections'] += pool.num_connections
+        self._manager.clear()
+        self._new_manager()
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            self._expire_idle()
+            parsed_url = urlparse(url)
+            key = (parsed_url.scheme, parsed_url.netloc)
+            if key not in self._pools:
+                self._pools[key] = self._manager.connection_from_url(url)
+            manager = self._manager
+        return manager.request(method, url, **kwargs)
+
+    def clear(self):
+        with self._lock:
+            self._retire()
+
+    def stats(self):
+        with self._lock:
+            requests = self._retired['requests'] + sum(pool.num_requests for pool in self._pools.values())
+            connections = self._retired['connections'] + sum(pool.num_connections for pool in self._pools.values())
+        return {
+            'requests': requests,
+            'connections': connections,
+            'reused': max(requests - connections, 0),
+            'idle_resets': self._idle_resets,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        ratio = (stats['reused'] / stats['requests'] * 100) if stats['requests'] else 0
+        return (
+            f"appium command pool: {stats['requests']} requests over {stats['connections']} connections "
+            f"({stats['reused']} reused, {ratio:.1f}%), {stats['idle_resets']} idle resets"
+        )
+
+
+def get_command_pool(config, timeout=None):
+    """Return the session wide `CommandPool` (or None if disabled with --appium_pool_size=0)"""
+    if not config.option.appium_pool_size:
+        return None
+    pool = getattr(config, '_appium_command_pool', None)
+    if pool is None:
+        pool = CommandPool(
+            maxsize=config.option.appium_pool_size,
+            idle_timeout=config.option.appium_pool_idle_timeout,
+            timeout=timeout,
+        )
+        config._appium_command_pool = pool
+    return pool
+
+
+def attach_command_pool(driver, config):
+    """Route all further commands from `driver` through the session `CommandPool`"""
+    command_executor = driver.command_executor
+    pool = get_command_pool(config, timeout=getattr(command_executor, '_timeout', None))
+    if pool is None:
+        return driver
+    command_executor.keep_alive = True
+    command_executor._conn = pool
+    return driver
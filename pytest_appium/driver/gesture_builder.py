@@ -0,0 +1,73 @@
+from selenium.webdriver.remote.command import Command
+
+
+class GestureBuilder():
+    """
+    Compile a sequence of swipes, taps and pauses into one W3C actions payload for a single touch pointer,
+    sent to the server in one request.
+
+    >>> gesture = GestureBuilder().swipe(500, 750, 500, 250, duration_ms=300).pause(100).tap(10, 20)
+    >>> len(gesture)
+    3
+    >>> [action['type'] for action in gesture.to_actions()['actions'][0]['actions']]
+    ['pointerMove', 'pointerDown', 'pointerMove', 'pointerUp', 'pause', 'pointerMove', 'pointerDown', 'pause', 'pointerUp']
+    >>> gesture.to_actions()['actions'][0]['actions'][2]
+    {'type': 'pointerMove', 'duration': 300, 'x': 500, 'y': 250, 'origin': 'viewport'}
+
+    >>> from unittest.mock import MagicMock
+    >>> driver = MagicMock()
+    >>> GestureBuilder(driver).tap(1, 2).perform()
+    >>> driver.execute.call_args[0][0]
+    'actions'
+    """
+
+    def __init__(self, driver=None, pointer_id='finger1'):
+        self.driver = driver
+        self.pointer_id = pointer_id
+        self._actions = []
+        self._gestures = 0
+
+    def __len__(self):
+        """Number of gestures (swipes, taps and pauses) in the sequence"""
+        return self._gestures
+
+    def _move(self, x, y, duration_ms=0):
+        self._actions.append({'type': 'pointerMove', 'duration': int(duration_ms), 'x': int(x), 'y': int(y), 'origin': 'viewport'})
+
+    def _pause(self, duration_ms):
+        self._actions.append({'type': 'pause', 'duration': int(duration_ms)})
+
+    def swipe(self, start_x, start_y, end_x, end_y, duration_ms=200):
+        self._move(start_x, start_y)
+        self._actions.append({'type': 'pointerDown', 'button': 0})
+        self._move(end_x, end_y, duration_ms)
+        self._actions.append({'type': 'pointerUp', 'button': 0})
+        self._gestures += 1
+        return self
+
+    def tap(self, x, y, duration_ms=50):
+        self._move(x, y)
+        self._actions.append({'type': 'pointerDown', 'button': 0})
+        self._pause(duration_ms)
+        self._actions.append({'type': 'pointerUp', 'button': 0})
+        self._gestures += 1
+        return self
+
+    def pause(self, duration_ms):
+        self._pause(duration_ms)
+        self._gestures += 1
+        return self
+
+    def to_actions(self):
+        return {'actions': [{
+            'type': 'pointer',
+            'id': self.pointer_id,
+            'parameters': {'pointerType': 'touch'},
+            'actions': list(self._actions),
+        }]}
+
+    def perform(self, driver=None):
+        driver = driver or self.driver
+        assert driver, 'GestureBuilder requires a driver to perform'
+        if self._actions:
+            driver.execute(Command.W3C_ACTIONS, self.to_actions())
@@ -0,0 +1,144 @@
+import json
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from time import perf_counter
+
+
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class LatencyHistogram():
+    """
+    Fixed log-scale buckets (milliseconds) so memory does not grow with the number of commands.
+    Percentiles are reported as the upper bound of the bucket they fall in.
+
+    >>> histogram = LatencyHistogram()
+    >>> for ms in (3, 4, 40, 900):
+    ...     histogram.add(ms)
+    >>> histogram.count, histogram.total, histogram.max
+    (4, 947, 900)
+    >>> histogram.percentile(50), histogram.percentile(95)
+    (5, 1000)
+    """
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms):
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.buckets[bisect_left(BUCKETS_MS, ms)] += 1
+
+    def percentile(self, percent):
+        threshold = self.count * percent / 100
+        cumulative = 0
+        for index, bucket_count in enumerate(self.buckets):
+            cumulative += bucket_count
+            if cumulative >= threshold:
+                return BUCKETS_MS[index] if index < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total, 3),
+            'max_ms': round(self.max, 3),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'buckets_ms': dict(zip(map(str, BUCKETS_MS + ('inf', )), self.buckets)),
+        }
+
+
+class CommandRecorder():
+    """
+    Record the latency of every WebDriver command, per command and per test.
+
+    >>> class CommandExecutor():
+    ...     def execute(self, command, params):
+    ...         return {'value': None}
+    >>> class Driver():
+    ...     command_executor = CommandExecutor()
+    >>> recorder = CommandRecorder()
+    >>> driver = Driver()
+    >>> recorder.instrument(driver)
+    >>> recorder.nodeid = 'test_a'
+    >>> _ = driver.command_executor.execute('findElement', {})
+    >>> _ = driver.command_executor.execute('findElement', {})
+    >>> recorder.commands['findElement'].count, recorder.tests['test_a']['findElement'].count
+    (2, 2)
+    >>> recorder.summary_lines()[0].split()
+    ['command', 'count', 'mean', 'p50', 'p95', 'max', 'total']
+    """
+
+    def __init__(self):
+        self.nodeid = 'session'
+        self.commands = defaultdict(LatencyHistogram)
+        self.tests = defaultdict(lambda: defaultdict(LatencyHistogram))
+        self._lock = threading.Lock()
+
+    def record(self, command, seconds):
+        ms = seconds * 1000
+        with self._lock:
+            self.commands[command].add(ms)
+            self.tests[self.nodeid][command].add(ms)
+
+    def instrument(self, driver):
+        command_executor = driver.command_executor
+        if getattr(command_executor, '_appium_instrumented', False):
+            return
+        execute = command_executor.execute
+
+        def _execute(command, params):
+            start = perf_counter()
+            try:
+                return execute(command, params)
+            finally:
+                self.record(command, perf_counter() - start)
+        command_executor.execute = _execute
+        command_executor._appium_instrumented = True
+
+    def summary_lines(self, commands=None):
+        commands = self.commands if commands is None else commands
+        lines = [f'{"command":<32} {"count":>7} {"mean":>9} {"p50":>7} {"p95":>7} {"max":>9} {"total":>10}']
+        for command, histogram in sorted(commands.items(), key=lambda item: -item[1].total):
+            lines.append(
+                f'{command:<32} {histogram.count:>7} {histogram.total / histogram.count:>7.1f}ms '
+                f'{histogram.percentile(50):>5}ms {histogram.percentile(95):>5}ms {histogram.max:>7.1f}ms {histogram.total / 1000:>9.2f}s'
+            )
+        return lines
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'commands': {command: histogram.to_dict() for command, histogram in self.commands.items()},
+                'tests': {
+                    nodeid: {command: histogram.to_dict() for command, histogram in commands.items()}
+                    for nodeid, commands in self.tests.items()
+                },
+            }
+
+    def write_json(self, path):
+        with open(path, 'w') as filehandle:
+            json.dump(self.to_dict(), filehandle, indent=2, sort_keys=True)
+
+
+def get_command_recorder(config):
+    """Return the session `CommandRecorder` (or None when instrumentation is not enabled)"""
+    if not (config.option.appium_instrument or config.option.appium_latency_json):
+        return None
+    if not hasattr(config, '_appium_command_recorder'):
+        config._appium_command_recorder = CommandRecorder()
+    return config._appium_command_recorder
+
+
+def instrument_driver(driver, config):
+    recorder = get_command_recorder(config)
+    if recorder is not None:
+        recorder.instrument(driver)
+    return driver
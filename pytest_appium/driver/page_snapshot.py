@@ -0,0 +1,216 @@
+import re
+from collections import defaultdict, namedtuple
+
+try:
+    from lxml import etree
+except ImportError:
+    import xml.etree.ElementTree as etree
+
+from pytest_appium._utils import derive_bounds
+from pytest_appium.android.UIAutomator2 import UiSelector, _PythonUIAutomatorBuilderMixin
+
+
+SnapshotElement = namedtuple('SnapshotElement', ('tag', 'attributes', 'bounds'))
+
+_ANDROID_BOUNDS = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+
+# UiSelector method -> page_source attribute
+_UISELECTOR_ATTRIBUTES = {
+    'text': 'text',
+    'description': 'content-desc',
+    'className': 'class',
+    'resourceId': 'resource-id',
+    'packageName': 'package',
+}
+_UISELECTOR_BOOLEANS = {
+    'checkable': 'checkable',
+    'checked': 'checked',
+    'clickable': 'clickable',
+    'enabled': 'enabled',
+    'focusable': 'focusable',
+    'focused': 'focused',
+    'longClickable': 'long-clickable',
+    'scrollable': 'scrollable',
+    'selected': 'selected',
+}
+_UISELECTOR_MATCHERS = {
+    '': lambda value, expected: value == expected,
+    'Contains': lambda value, expected: expected in value,
+    'StartsWith': lambda value, expected: value.startswith(expected),
+    'Matches': lambda value, expected: re.fullmatch(expected, value) is not None,
+}
+
+
+def _parse_bounds(attributes):
+    """
+    Android exposes `bounds="[x1,y1][x2,y2]"`, iOS exposes `x`, `y`, `width`, `height`
+
+    >>> _parse_bounds({'bounds': '[0,100][1080,300]'})['height']
+    200
+    >>> _parse_bounds({'x': '10', 'y': '20', 'width': '30', 'height': '40'})['end_x']
+    39
+    >>> _parse_bounds({})
+    """
+    match = _ANDROID_BOUNDS.match(attributes.get('bounds', ''))
+    if match:
+        x1, y1, x2, y2 = map(int, match.groups())
+        return derive_bounds({'width': x2 - x1, 'height': y2 - y1, 'x': x1, 'y': y1})
+    if all(key in attributes for key in ('x', 'y', 'width', 'height')):
+        return derive_bounds({key: int(attributes[key]) for key in ('width', 'height', 'x', 'y')})
+    return None
+
+
+class PageSnapshot():
+    """
+    A parsed and indexed `page_source` that resolves locators locally without further device round trips.
+
+    Supports `id`, `accessibility id`, `class name`, `xpath` and `UiSelector` builder objects.
+    Full XPath requires `lxml`; otherwise the ElementTree XPath subset is used.
+
+    >>> snapshot = PageSnapshot('''
+    ... <hierarchy>
+    ...   <android.widget.FrameLayout class="android.widget.FrameLayout" resource-id="app:id/root" bounds="[0,0][1080,1920]">
+    ...     <android.widget.TextView class="android.widget.TextView" index="0" text="Hello" resource-id="app:id/title" bounds="[0,0][1080,100]"/>
+    ...     <android.widget.Button class="android.widget.Button" index="1" text="OK" content-desc="confirm" clickable="true" bounds="[0,100][540,200]"/>
+    ...     <android.widget.Button class="android.widget.Button" index="2" text="Cancel" clickable="true" bounds="[540,100][1080,200]"/>
+    ...   </android.widget.FrameLayout>
+    ... </hierarchy>
+    ... ''')
+    >>> snapshot.find(('id', 'title')).attributes['text']
+    'Hello'
+    >>> snapshot.find(('accessibility id', 'confirm')).bounds['mid_x']
+    270.0
+    >>> [el.attributes['text'] for el in snapshot.find_all(('class name', 'android.widget.Button'))]
+    ['OK', 'Cancel']
+    >>> snapshot.find(('xpath', '//android.widget.Button[@text="Cancel"]')).attributes['index']
+    '2'
+    >>> snapshot.find(UiSelector().textStartsWith('Can').clickable(True)).attributes['text']
+    'Cancel'
+    >>> snapshot.find(UiSelector().resourceIdMatches('.*:id/root').childSelector(UiSelector().className('android.widget.Button').instance(1))).attributes['text']
+    'Cancel'
+    >>> snapshot.find(UiSelector().text('Hello').fromParent(UiSelector().index(1))).attributes['text']
+    'OK'
+    >>> [len(matches) for matches in snapshot.resolve([('id', 'title'), ('id', 'missing'), UiSelector().className('android.widget.Button')])]
+    [1, 0, 2]
+    """
+
+    def __init__(self, page_source):
+        if isinstance(page_source, str):
+            page_source = page_source.encode('utf-8')
+        self.root = etree.fromstring(page_source)
+        self._elements = []
+        self._parents = {}
+        self._snapshot_elements = {}
+        self._index = defaultdict(lambda: defaultdict(list))
+        for parent in self.root.iter():
+            for child in parent:
+                self._parents[child] = parent
+        for element in self.root.iter():
+            if element is self.root:
+                continue
+            self._elements.append(element)
+            attributes = element.attrib
+            resource_id = attributes.get('resource-id')
+            if resource_id:
+                self._index['id'][resource_id].append(element)
+                if ':id/' in resource_id:
+                    self._index['id'][resource_id.split(':id/', 1)[1]].append(element)
+            for key in ('content-desc', 'name'):
+                if attributes.get(key):
+                    self._index['accessibility id'][attributes[key]].append(element)
+            if attributes.get('name'):
+                self._index['id'][attributes['name']].append(element)  # iOS `id` is the element name
+            self._index['class name'][self._class_name(element)].append(element)
+
+    @staticmethod
+    def _class_name(element):
+        return element.attrib.get('class') or element.attrib.get('type') or element.tag
+
+    def _snapshot_element(self, element):
+        if element not in self._snapshot_elements:
+            attributes = dict(element.attrib)
+            self._snapshot_elements[element] = SnapshotElement(element.tag, attributes, _parse_bounds(attributes))
+        return self._snapshot_elements[element]
+
+    def _unique(self, elements):
+        seen = set()
+        return [element for element in elements if not (element in seen or seen.add(element))]
+
+    def _xpath(self, expression):
+        if hasattr(self.root, 'xpath'):  # lxml
+            return [element for element in self.root.getroottree().xpath(expression) if hasattr(element, 'attrib')]
+        if expression.startswith('/'):
+            expression = '.' + expression if expression.startswith('//') else './' + expression.split('/', 2)[-1]
+        return self.root.findall(expression)
+
+    def _descendants(self, element):
+        return [descendant for descendant in element.iter() if descendant is not element]
+
+    def _uiselector(self, selector, candidates):
+        for method_name, args in selector.segments.items():
+            if method_name in ('instance', 'childSelector', 'fromParent'):
+                continue
+            arg = selector.preprocess(method_name, args[0]) if args else None
+            if method_name == 'index':
+                candidates = [element for element in candidates if element.attrib.get('index') == str(arg)]
+            elif method_name in _UISELECTOR_BOOLEANS:
+                expected = 'true' if arg else 'false'
+                candidates = [element for element in candidates if element.attrib.get(_UISELECTOR_BOOLEANS[method_name]) == expected]
+            else:
+                for prefix, attribute in _UISELECTOR_ATTRIBUTES.items():
+                    suffix = method_name[len(prefix):]
+                    if method_name.startswith(prefix) and suffix in _UISELECTOR_MATCHERS:
+                        matcher = _UISELECTOR_MATCHERS[suffix]
+                        if attribute == 'class':
+                            candidates = [element for element in candidates if matcher(self._class_name(element), arg)]
+                        else:
+                            candidates = [element for element in candidates if matcher(element.attrib.get(attribute, ''), arg)]
+                        break
+                else:
+                    raise NotImplementedError(f'UiSelector().{method_name}() can not be resolved locally')
+        if 'instance' in selector.segments:
+            instance = selector.segments['instance'][0]
+            candidates = candidates[instance:instance + 1]
+        if 'childSelector' in selector.segments:
+            child_selector = selector.segments['childSelector'][0]
+            candidates = self._unique(
+                match
+                for element in candidates
+                for match in self._uiselector(child_selector, self._descendants(element))
+            )
+        if 'fromParent' in selector.segments:
+            parent_selector = selector.segments['fromParent'][0]
+            candidates = self._unique(
+                match
+                for element in candidates if element in self._parents
+                for match in self._uiselector(parent_selector, self._descendants(self._parents[element]))
+            )
+        return candidates
+
+    def _find_elements(self, locator):
+        if isinstance(locator, _PythonUIAutomatorBuilderMixin):
+            by, value = None, locator
+        else:
+            by, value = locator
+        if isinstance(value, UiSelector):
+            return self._uiselector(value, self._elements)
+        if isinstance(value, _PythonUIAutomatorBuilderMixin):
+            raise NotImplementedError(f'{type(value).__name__} requires the device to scroll and can not be resolved locally')
+        if by == 'xpath':
+            return self._xpath(value)
+        if by in self._index:
+            return self._index[by].get(value, [])
+        raise NotImplementedError(f'Locator strategy {by} can not be resolved locally. Pass UiSelector objects rather than strings.')
+
+    def find_all(self, locator):
+        """All SnapshotElement's matching `locator`, in document order"""
+        return [self._snapshot_element(element) for element in self._find_elements(locator)]
+
+    def find(self, locator):
+        """The first SnapshotElement matching `locator` or None"""
+        elements = self.find_all(locator)
+        return elements[0] if elements else None
+
+    def resolve(self, locators):
+        """Resolve a batch of locators. Returns a list of matches for each locator"""
+        return [self.find_all(locator) for locator in locators]
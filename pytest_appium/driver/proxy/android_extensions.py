@@ -2,8 +2,12 @@ import logging
 from time import sleep
 from contextlib import contextmanager
 
-from pytest_appium.android.UIAutomator2 import UiSelector, UiScrollable
+from appium.webdriver.common.mobileby import MobileBy
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+from pytest_appium.android.UIAutomator2 import UiSelector, UiScrollable, UiCollection
 from pytest_appium.driver.proxy.proxy_mixin import register_proxy_mixin
+from pytest_appium.driver.proxy._enums import Axis, Direction
 
 
 log = logging.getLogger(__name__)
@@ -21,6 +25,53 @@ class AndroidUIAutomator2Mixin():
             selector = str(selector)
         return self.__class__.find_element_by_android_uiautomator(self, selector)
 
+    def _uiselector_string(self, locator):
+        """UiSelector java string equivalent to `locator`, or NotImplementedError"""
+        if isinstance(locator, (UiScrollable, UiSelector, UiCollection)):
+            return str(locator)
+        by, value = locator
+        if by == MobileBy.ANDROID_UIAUTOMATOR:
+            return value
+        if by == MobileBy.ID:
+            return str(UiSelector(app_package=None if ':id/' in value else self.capabilities.get('appPackage')).resourceId(value))
+        if by == MobileBy.ACCESSIBILITY_ID:
+            return str(UiSelector().description(value))
+        if by == MobileBy.CLASS_NAME:
+            return str(UiSelector().className(value))
+        raise NotImplementedError(f'Locator strategy {by} can not be expressed as a UiSelector')
+
+    def native_scroll_into_view(self, locator, swipe_direction=Direction.UP):
+        """
+        UiAutomator scrolls the first scrollable container on the device until the element is in view (one request).
+
+        >>> from unittest.mock import MagicMock
+        >>> t = AndroidUIAutomator2Mixin()
+        >>> t.capabilities = {'appPackage': 'com.example'}
+        >>> t.find_element = MagicMock(return_value='FOUND')
+        >>> t.native_scroll_into_view(('id', 'title'))
+        'FOUND'
+        >>> t.find_element.call_args[0][1]
+        'new UiScrollable(new UiSelector().scrollable(true)).scrollIntoView(new UiSelector().resourceId("com.example:id/title"))'
+        >>> t.native_scroll_into_view(('id', 'title'), Direction.LEFT) and t.find_element.call_args[0][1]
+        'new UiScrollable(new UiSelector().scrollable(true)).setAsHorizontalList().scrollIntoView(new UiSelector().resourceId("com.example:id/title"))'
+        """
+        selector = self._uiselector_string(locator)
+        scrolls = not selector.startswith('new UiScrollable(')
+        if scrolls:
+            scrollable = UiScrollable(UiSelector().scrollable(True))
+            if isinstance(swipe_direction, Direction) and swipe_direction.axis == Axis.X:
+                scrollable.setAsHorizontalList()
+            selector = f'{scrollable}.scrollIntoView({selector})'
+        try:
+            return self.find_element(MobileBy.ANDROID_UIAUTOMATOR, selector)
+        except NoSuchElementException:
+            if not scrolls:
+                return None
+            # Not within a scrollable container (or there is none on screen); it may still be visible
+            return self.find_element_safe(MobileBy.ANDROID_UIAUTOMATOR, self._uiselector_string(locator))
+        except WebDriverException as ex:
+            raise NotImplementedError(f'UiScrollable is not supported by this automation: {ex}') from ex
+
     def find_text_on_page(self, text):
         return self.find_element_on_page(UiSelector().text(text))
 
@@ -1,14 +1,19 @@
+import hashlib
 import logging
-from time import sleep
+from contextlib import contextmanager
+from time import monotonic, sleep
 from collections import namedtuple
 
 from appium.webdriver.common.touch_action import TouchAction
-from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException
+from selenium.common.exceptions import WebDriverException, NoSuchElementException, StaleElementReferenceException
+from selenium.webdriver.remote.command import Command
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
+from pytest_appium._utils import derive_bounds
 from pytest_appium.android.UIAutomator2 import UiSelector, UiScrollable
 
+from ..gesture_builder import GestureBuilder
+from ..page_snapshot import PageSnapshot
 from ._enums import Axis, Direction, Signum
 from .proxy_mixin import register_proxy_mixin
 
@@ -24,15 +29,149 @@ class PlatformShortcutMixin():
 
 @register_proxy_mixin
 class WebDriverWaitMixin():
+    """
+    Waits poll with an adaptive interval: probes start quickly and back off towards
+    `WAIT_FOR_POLL_MAX_SECONDS`, so conditions that are already (or nearly) true return fast
+    while long waits do not flood the device with probes.
+    """
     WAIT_FOR_DEFAULT_TIMEOUT_SECONDS = 5
+    WAIT_FOR_POLL_INITIAL_SECONDS = 0.05
+    WAIT_FOR_POLL_MAX_SECONDS = 1
+    WAIT_FOR_POLL_BACKOFF = 1.5
+    WAIT_FOR_IGNORED_EXCEPTIONS = (NoSuchElementException, StaleElementReferenceException)
+
+    def _poll_intervals(self):
+        interval = self.WAIT_FOR_POLL_INITIAL_SECONDS
+        while True:
+            yield interval
+            interval = min(interval * self.WAIT_FOR_POLL_BACKOFF, self.WAIT_FOR_POLL_MAX_SECONDS)
+
+    def _poll(self, probe, timeout=None):
+        """Call `probe()` until it returns a truthy value (returned) or `timeout` expires (None)"""
+        expire = monotonic() + (timeout or self.WAIT_FOR_DEFAULT_TIMEOUT_SECONDS)
+        for interval in self._poll_intervals():
+            result = probe()
+            if result:
+                return result
+            remaining = expire - monotonic()
+            if remaining <= 0:
+                return None
+            sleep(min(interval, remaining))
+
+    def _condition(self, condition):
+        """A condition is a callable(driver) or a tuple of (expected_conditions name, *args)"""
+        if callable(condition):
+            return condition
+        expected_condition, *args = condition
+        return getattr(EC, expected_condition)(*args)
+
+    def _check(self, condition):
+        try:
+            return condition(self)
+        except self.WAIT_FOR_IGNORED_EXCEPTIONS:
+            return False
+
     def wait_for(self, *args, timeout=None, expected_condition='presence_of_element_located', **kwargs):
         """
         https://seleniumhq.github.io/selenium/docs/api/py/webdriver_support/selenium.webdriver.support.expected_conditions.html#module-selenium.webdriver.support.expected_conditions
         """
-        try:
-            return WebDriverWait(self, timeout or self.WAIT_FOR_DEFAULT_TIMEOUT_SECONDS).until(getattr(EC, expected_condition)(*args, **kwargs))
-        except TimeoutException:
-            return None
+        condition = getattr(EC, expected_condition)(*args, **kwargs)
+        return self._poll(lambda: self._check(condition), timeout)
+
+    def wait_for_any(self, conditions, timeout=None):
+        """
+        Check every condition each poll round. Return (key, result) of the first condition met, or None on timeout.
+        `conditions` is a dict of {key: condition} (or a sequence, keyed by index).
+
+        >>> from unittest.mock import MagicMock
+        >>> t = WebDriverWaitMixin()
+        >>> t.find_element = MagicMock(side_effect=NoSuchElementException())
+        >>> probes = iter([False, False, 'ERROR DIALOG'])
+        >>> t.wait_for_any({
+        ...     'home': ('presence_of_element_located', ('id', 'home')),
+        ...     'error': lambda driver: next(probes),
+        ... }, timeout=1)
+        ('error', 'ERROR DIALOG')
+        >>> t.wait_for_any([lambda driver: False], timeout=0.1)
+        """
+        if not isinstance(conditions, dict):
+            conditions = dict(enumerate(conditions))
+        conditions = {key: self._condition(condition) for key, condition in conditions.items()}
+
+        def _probe():
+            for key, condition in conditions.items():
+                result = self._check(condition)
+                if result:
+                    return (key, result)
+        return self._poll(_probe, timeout)
+
+    def wait_for_all(self, conditions, timeout=None):
+        """
+        Wait until every condition has been met (each is only probed until it is met).
+        Return a dict of {key: result}, or None on timeout.
+
+        >>> t = WebDriverWaitMixin()
+        >>> probes = iter([False, 'B'])
+        >>> t.wait_for_all({'a': lambda driver: 'A', 'b': lambda driver: next(probes)}, timeout=1)
+        {'a': 'A', 'b': 'B'}
+        """
+        if not isinstance(conditions, dict):
+            conditions = dict(enumerate(conditions))
+        pending = {key: self._condition(condition) for key, condition in conditions.items()}
+        results = {}
+
+        def _probe():
+            for key, condition in tuple(pending.items()):
+                result = self._check(condition)
+                if result:
+                    results[key] = result
+                    del pending[key]
+            return not pending
+        if self._poll(_probe, timeout):
+            return {key: results[key] for key in conditions}
+
+
+ScrollSearchResult = namedtuple('ScrollSearchResult', ('element', 'strategy', 'round_trips'))
+
+
+@contextmanager
+def _count_requests(command_executor):
+    """Count the commands sent through `command_executor` within the block. Yields a one item list holding the count"""
+    count = [0]
+    if command_executor is None:
+        yield count
+        return
+    instance_execute = vars(command_executor).get('execute')
+    execute = command_executor.execute
+
+    def _execute(command, params):
+        count[0] += 1
+        return execute(command, params)
+    command_executor.execute = _execute
+    try:
+        yield count
+    finally:
+        if instance_execute is None:
+            del command_executor.execute
+        else:
+            command_executor.execute = instance_execute
+
+
+def _element_rect(el):
+    """
+    Size and location with one request. (selenium only uses the rect command for W3C sessions and
+    otherwise queries size and location separately)
+    """
+    try:
+        return el._execute(Command.GET_ELEMENT_RECT)['value']
+    except WebDriverException:
+        rect = dict(el.size)
+        rect.update(el.location)
+        return rect
+
+
+def _rect_bounds(rect):
+    return derive_bounds({'width': rect['width'], 'height': rect['height'], 'x': rect['x'], 'y': rect['y']})
 
 
 @register_proxy_mixin
@@ -54,42 +193,73 @@ class AppiumElementHelperMixin():
         """
         Acquire a dict with pre-generated values for various x,y,width,height,midpoints.
         If a locator is not provided, the element falls back to the screen size.
+        The element's size and location are read with a single rect query.
 
         >>> from unittest.mock import MagicMock
         >>> t = AppiumElementHelperMixin(default_swipe_duration=300)
         >>> class MockElement():
-        ...     size = {'width': 1000, 'height': 1000}
-        ...     location = {'x': 500, 'y': 500}
+        ...     def _execute(self, command):
+        ...         return {'value': {'x': 500, 'y': 500, 'width': 1000, 'height': 1000}}
         >>> t.find_element = MagicMock(return_value=MockElement())
 
         >>> t.get_element_bounds(locator=('MOCK_SELECTOR',))
         {'width': 1000, 'height': 1000, 'x': 500, 'y': 500, 'mid_x': 1000.0, 'mid_y': 1000.0, 'end_x': 1499, 'end_y': 1499}
 
         """
-        if locator:
-            el = self.find_element(*locator)
-            el_size = el.size
-            el_location = el.location
-            bounds = {
-                'width': el_size.get('width'),
-                'height': el_size.get('height'),
-                'x': el_location.get('x'),
-                'y': el_location.get('y'),
-            }
-        else:
-            bounds = {
-                'width': self.get_window_size()['width'],
-                'height': self.get_window_size()['height'],
-                'x': 0,
-                'y': 0,
-            }
-        bounds.update({
-            'mid_x': bounds['x'] + bounds['width'] * 0.5,
-            'mid_y': bounds['y'] + bounds['height'] * 0.5,
-            'end_x': bounds['x'] + bounds['width'] - 1,
-            'end_y': bounds['y'] + bounds['height'] - 1,
-        })
-        return bounds
+        if not locator:
+            return self.get_screen_bounds()
+        return _rect_bounds(_element_rect(self.find_element(*locator)))
+
+    def get_elements_bounds(self, locators):
+        """
+        Bounds for many locators together, or None for a locator that matches nothing.
+        The locators are resolved against one `page_source`; only locators that can not be resolved
+        locally (or whose element has no bounds in the page source) fall back to a find and rect query each.
+
+        >>> from unittest.mock import MagicMock
+        >>> t = AppiumElementHelperMixin()
+        >>> t.page_source = '<hierarchy><node resource-id="app:id/a" bounds="[0,0][10,20]"/></hierarchy>'
+        >>> [bounds and bounds['height'] for bounds in t.get_elements_bounds([('id', 'a'), ('id', 'b')])]
+        [20, None]
+        >>> class MockElement():
+        ...     def _execute(self, command):
+        ...         return {'value': {'x': 0, 'y': 0, 'width': 30, 'height': 40}}
+        >>> t.find_element = MagicMock(return_value=MockElement())
+        >>> [bounds['height'] for bounds in t.get_elements_bounds([('-ios predicate string', 'name == "a"')])]
+        [40]
+        """
+        snapshot = PageSnapshot(self.page_source)
+
+        def _bounds(locator):
+            try:
+                element = snapshot.find(locator)
+            except NotImplementedError:
+                element = True
+            if element is None:
+                return None
+            if element is True or element.bounds is None:
+                el = self.find_element_safe(*locator)
+                return _rect_bounds(_element_rect(el)) if el else None
+            return element.bounds
+        return [_bounds(locator) for locator in locators]
+
+    def get_screen_bounds(self):
+        """
+        Window bounds. Cached for the session until the orientation is changed through this driver.
+
+        >>> from unittest.mock import MagicMock
+        >>> t = AppiumElementHelperMixin()
+        >>> t.get_window_size = MagicMock(return_value={'width': 1080, 'height': 1920})
+        >>> t.get_screen_bounds()['mid_y'], t.get_screen_bounds()['end_x'], t.get_window_size.call_count
+        (960.0, 1079, 1)
+        """
+        session_id = getattr(self, 'session_id', None)
+        cached = getattr(self, '_appium_screen_bounds', None)
+        if not cached or cached[0] != session_id:
+            window_size = self.get_window_size()
+            cached = (session_id, {'width': window_size['width'], 'height': window_size['height'], 'x': 0, 'y': 0})
+            self._appium_screen_bounds = cached
+        return derive_bounds(dict(cached[1]))
 
     def swipe_element(self, direction=Direction.LEFT, swipe_distance=0.7, repeat=1, swipe_locator=None, duration_ms=None):  # , sleep_secs=0.5
         """
@@ -116,6 +286,12 @@ class AppiumElementHelperMixin():
         >>> t.swipe_element(Direction.LEFT, swipe_distance=0.8)
         >>> t.swipe.assert_called_with(900, 500, 100, 500, duration=300)
 
+        Repeated swipes are sent together as one actions request
+
+        >>> t.execute = MagicMock()
+        >>> t.swipe_element(Direction.UP, swipe_distance=0.5, repeat=3)
+        >>> t.execute.call_count, t.swipe.call_count
+        (1, 5)
         """
         if isinstance(direction, str):
             direction = direction.upper()
@@ -141,36 +317,145 @@ class AppiumElementHelperMixin():
         })
 
         assert all(map(lambda x: x >= 0, swipe_params)), f'All swipe co-ordinates should be positive {swipe_params}'
+        duration_ms = duration_ms or self._default_swipe_duration
+        if repeat == 1:
+            self.swipe(*swipe_params, duration=duration_ms)
+            return
+        gesture = GestureBuilder(self)
         for i in range(0, repeat):
-            self.swipe(*swipe_params, duration=duration_ms or self._default_swipe_duration)
-            #sleep(float(sleep_secs))
+            gesture.swipe(*swipe_params, duration_ms=duration_ms)
+        gesture.perform()
+
+    def _scroll_fingerprint(self):
+        """Identity of the visible hierarchy. Unchanged after a swipe means the end of scroll was reached"""
+        return hashlib.sha1(self.page_source.encode('utf-8')).hexdigest()
 
-    def find_element_on_page(self, locator, swipe_direction=Direction.UP, max_swipes=4, **kwargs):
+    def find_element_on_page(self, locator, swipe_direction=Direction.UP, max_swipes=4, detect_end_of_scroll=True, native_scroll=True, **kwargs):
         """
         Largely reproduces the role/concept of the Android `UiScrollable` but it platform dependent.
+        See `scroll_search`, which also reports how the element was found and how many round trips it took.
+
+        With `detect_end_of_scroll` swiping in a direction stops (and reverses) as soon as a swipe
+        leaves the visible hierarchy unchanged.
+
+        >>> from unittest.mock import MagicMock
+        >>> t = AppiumElementHelperMixin()
+        >>> t.find_element_safe = MagicMock(return_value=None)
+        >>> t.swipe_element = MagicMock()
+        >>> t.page_source = '<hierarchy/>'
+        >>> t.find_element_on_page(('id', 'missing'))
+        >>> t.swipe_element.call_count, t.find_element_safe.call_count
+        (2, 1)
+
+        >>> t.find_element_safe = MagicMock(side_effect=[None, None, 'FOUND'])
+        >>> t.find_element_on_page(('id', 'found'), detect_end_of_scroll=False)
+        'FOUND'
+        """
+        return self.scroll_search(
+            locator, swipe_direction, max_swipes=max_swipes, detect_end_of_scroll=detect_end_of_scroll,
+            native_scroll=native_scroll, **kwargs
+        ).element
+
+    def native_scroll_into_view(self, locator, swipe_direction):
         """
+        Scroll on the device until `locator` is visible and return the element, or None when the device did not find it.
+        Raises NotImplementedError where the platform (or the locator strategy) has no device-side scroll.
+        Overridden by the platform mixins.
+        """
+        raise NotImplementedError(f'No device-side scroll for platform {getattr(self, "platform", None)}')
+
+    def scroll_search(self, locator, swipe_direction=Direction.UP, max_swipes=4, detect_end_of_scroll=True, native_scroll=True, **kwargs):
+        """
+        Locate an element that may be scrolled off screen.
+
+        The search is delegated to the device with `native_scroll_into_view` where the platform supports it,
+        otherwise the client swipes (see `find_element_on_page`).
+        Returns ScrollSearchResult(element, strategy, round_trips) where strategy is 'native' or 'swipe'.
+
+        >>> from unittest.mock import MagicMock
+        >>> t = AppiumElementHelperMixin()
+        >>> t.native_scroll_into_view = MagicMock(return_value='FOUND')
+        >>> t.scroll_search(('id', 'found'))
+        ScrollSearchResult(element='FOUND', strategy='native', round_trips=0)
+        """
+        with _count_requests(getattr(self, 'command_executor', None)) as requests:
+            element = None
+            strategy = 'native' if native_scroll else 'swipe'
+            if native_scroll:
+                try:
+                    element = self.native_scroll_into_view(locator, swipe_direction)
+                except NotImplementedError as ex:
+                    log.debug(f'Swiping rather than scrolling on the device to locate {locator}: {ex}')
+                    strategy = 'swipe'
+            if strategy == 'swipe':
+                element = self._swipe_search(locator, swipe_direction, max_swipes, detect_end_of_scroll, **kwargs)
+        result = ScrollSearchResult(element, strategy, requests[0])
+        log.debug(f'scroll_search {locator}: {result}')
+        return result
+
+    def _swipe_search(self, locator, swipe_direction, max_swipes, detect_end_of_scroll, **kwargs):
         if isinstance(locator, (UiScrollable, UiSelector)):
             locator = locator.build()
         kwargs.setdefault('swipe_distance', 0.35)
-        def _find(swipe_direction):
+
+        def _find(swipe_direction, fingerprint):
             for i in range(0, max_swipes):
+                log.debug(f'Swiping again to locate {locator}')
+                if detect_end_of_scroll and fingerprint is None:
+                    fingerprint = self._scroll_fingerprint()
+                self.swipe_element(direction=swipe_direction, **kwargs)
+                if detect_end_of_scroll:
+                    previous_fingerprint, fingerprint = fingerprint, self._scroll_fingerprint()
+                    if fingerprint == previous_fingerprint:
+                        log.debug(f'End of scroll {swipe_direction} reached while locating {locator}')
+                        return None, fingerprint
                 el = self.find_element_safe(*locator)
                 if el:
-                    return el
-                else:
-                    log.debug(f'Swiping again to locate {locator}')
-                    self.swipe_element(direction=swipe_direction, **kwargs)
-                el = self.find_element_safe(*locator)
-                if el:
-                    return el
-        el = _find(swipe_direction)
+                    return el, fingerprint
+            return None, fingerprint
+
+        el = self.find_element_safe(*locator)
+        if el:
+            return el
+        el, fingerprint = _find(swipe_direction, None)
         if not el and isinstance(swipe_direction, Direction):
-             el = _find(swipe_direction.inverse)
+            el, _ = _find(swipe_direction.inverse, fingerprint)
         return el
 
 
+@register_proxy_mixin
+class PageSnapshotMixin():
+    def page_snapshot(self):
+        """
+        Fetch `page_source` once and return a `PageSnapshot` to resolve many locators locally.
+        The snapshot does not update; take a new one after the screen changes.
+        """
+        return PageSnapshot(self.page_source)
+
+    def resolve_locators(self, locators):
+        """
+        Resolve a batch of locators against a single `page_source`.
+        Returns a list of SnapshotElement(tag, attributes, bounds) matches for each locator.
+
+        >>> from unittest.mock import MagicMock
+        >>> t = PageSnapshotMixin()
+        >>> t.page_source = '<hierarchy><node resource-id="app:id/a" bounds="[0,0][10,10]"/></hierarchy>'
+        >>> [[el.bounds['width'] for el in matches] for matches in t.resolve_locators([('id', 'a'), ('id', 'b')])]
+        [[10], []]
+        """
+        return self.page_snapshot().resolve(locators)
+
+
 @register_proxy_mixin
 class Gestures():
+    def gesture(self):
+        """
+        A `GestureBuilder` bound to this driver. Chained swipes, taps and pauses are sent in one request
+
+            appium_extended.gesture().swipe(500, 1500, 500, 500).pause(200).tap(540, 960).perform()
+        """
+        return GestureBuilder(self)
+
     def tap_a_point(self, x=0, y=0):
         """ Click A Point does not work as it uses action.press() """
         action = TouchAction(self)
@@ -188,6 +473,15 @@ class Orientation():
     def set_orientation(self, orientation):
         self.orientation = orientation
 
+    @property
+    def orientation(self):
+        return self.__wrapped__.orientation
+
+    @orientation.setter
+    def orientation(self, value):
+        self.__wrapped__.orientation = value
+        self._appium_screen_bounds = None  # width and height swap
+
     def remember_original_orientation(self):
         self.original_orientation = self.get_orientation()
 
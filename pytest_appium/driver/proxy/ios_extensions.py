@@ -2,6 +2,7 @@ import logging
 from contextlib import contextmanager
 
 from appium.webdriver.common.mobileby import MobileBy as By
+from selenium.common.exceptions import WebDriverException
 
 from pytest_appium._utils import wait_for
 from pytest_appium.driver.proxy.proxy_mixin import register_proxy_mixin
@@ -34,3 +35,38 @@ class IOSWebViewMixin():
         self.switch_to.context(target_context_name)
         yield None
         self.switch_to.context(current_context_name)
+
+
+@register_proxy_mixin(name='ios')
+class IOSScrollMixin():
+
+    def native_scroll_into_view(self, locator, swipe_direction=None):
+        """
+        XCUITest `mobile: scroll` scrolls on the device until the named (or predicate matching) element is visible.
+        The element is then located (two requests).
+
+        >>> from unittest.mock import MagicMock
+        >>> t = IOSScrollMixin()
+        >>> t.execute_script = MagicMock()
+        >>> t.find_element_safe = MagicMock(return_value='FOUND')
+        >>> t.native_scroll_into_view(('accessibility id', 'Settings'))
+        'FOUND'
+        >>> t.execute_script.call_args[0]
+        ('mobile: scroll', {'name': 'Settings'})
+        """
+        if not isinstance(locator, tuple):
+            raise NotImplementedError(f'{type(locator).__name__} locators are Android only')
+        by, value = locator
+        if by in (By.ACCESSIBILITY_ID, By.ID):
+            params = {'name': value}
+        elif by == By.IOS_PREDICATE:
+            params = {'predicateString': value}
+        elif by == By.CLASS_NAME:
+            params = {'predicateString': f"type == '{value}'"}
+        else:
+            raise NotImplementedError(f'Locator strategy {by} can not be scrolled to on the device')
+        try:
+            self.execute_script('mobile: scroll', params)
+        except WebDriverException as ex:
+            log.debug(f'mobile: scroll did not reach {locator}: {ex}')
+        return self.find_element_safe(by, value)
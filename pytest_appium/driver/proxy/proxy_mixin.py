@@ -18,13 +18,61 @@ def register_proxy_mixin(cls=None, *, name=DEFAULT_REGISTRATION_NAME):
     return cls
 
 
+def _mixins(names):
+    """Mixins for each registration name. Later names take precedence (e.g. platform over base)"""
+    mixins = []
+    for name in reversed(names):
+        mixins.extend(mixin for mixin in MIXIN_CLASSS[name] if mixin not in mixins)
+    return tuple(mixins)
+
+
 @functools.lru_cache()
-def _generate_proxy_class(name=DEFAULT_REGISTRATION_NAME):
-    return type(name, (wrapt.ObjectProxy,) + tuple(MIXIN_CLASSS[name]), {})
+def _generate_proxy_class(*names):
+    return type('_'.join(names), (wrapt.ObjectProxy,) + _mixins(names), {})
+
 
+def proxy(obj, *names):
+    """
+    Overlay the mixins registered under `names` (default 'base') over `obj` with a single proxy.
 
-def proxy(obj, name=DEFAULT_REGISTRATION_NAME):
-    obj_proxy = _generate_proxy_class(name)(obj)
-    for mixin in MIXIN_CLASSS[name]:
+    >>> @register_proxy_mixin(name='_doctest_base')
+    ... class BaseMixin():
+    ...     def hello(self):
+    ...         return 'base'
+    ...     def upper(self):
+    ...         return self.hello().upper()
+    >>> @register_proxy_mixin(name='_doctest_platform')
+    ... class PlatformMixin():
+    ...     def __init__(self):
+    ...         self.calls = 0
+    ...     def hello(self):
+    ...         self.calls += 1
+    ...         return 'platform'
+    ...     def reset_proxy_mixin(self):
+    ...         self.calls = 0
+    >>> class Driver():
+    ...     pass
+    >>> obj_proxy = proxy(Driver(), '_doctest_base', '_doctest_platform')
+    >>> obj_proxy.upper(), obj_proxy.calls
+    ('PLATFORM', 1)
+    >>> isinstance(obj_proxy.__wrapped__, Driver)
+    True
+    >>> reset_proxy(obj_proxy)
+    >>> obj_proxy.calls
+    0
+    """
+    names = names or (DEFAULT_REGISTRATION_NAME, )
+    obj_proxy = _generate_proxy_class(*names)(obj)
+    for mixin in _mixins(names):
         mixin.__init__(obj_proxy)
     return obj_proxy
+
+
+def reset_proxy(obj_proxy):
+    """
+    Explicit hook to reset per-test mixin state on a reused proxy.
+    Calls `reset_proxy_mixin()` on each mixin that defines it.
+    """
+    for mixin in type(obj_proxy).__mro__:
+        if 'reset_proxy_mixin' in vars(mixin):
+            mixin.reset_proxy_mixin(obj_proxy)
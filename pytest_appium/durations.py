@@ -0,0 +1,132 @@
+import json
+import logging
+import os
+import statistics
+from collections import defaultdict
+
+from .probe_cache import _file_lock
+
+
+log = logging.getLogger(__name__)
+
+DURATIONS_CACHE_KEY = 'pytest_appium/durations'
+DEFAULT_DURATION_SECONDS = 1.0
+
+
+def parse_shard(value):
+    """
+    '--appium_shard i/N' (1 based) -> (index, count) (0 based)
+
+    >>> parse_shard('2/4')
+    (1, 4)
+    >>> parse_shard('5/4')
+    Traceback (most recent call last):
+    ...
+    ValueError: shard should be i/N with 1 <= i <= N, not 5/4
+    """
+    index, _, count = value.partition('/')
+    index, count = int(index), int(count)
+    if not 1 <= index <= count:
+        raise ValueError(f'shard should be i/N with 1 <= i <= N, not {value}')
+    return index - 1, count
+
+
+def _merge(previous, measured):
+    """
+    Smooth new measurements with the previous durations
+
+    >>> _merge({'a': 10.0, 'b': 1.0}, {'a': 20.0, 'c': 3.0})
+    {'a': 15.0, 'b': 1.0, 'c': 3.0}
+    """
+    durations = dict(previous)
+    for nodeid, seconds in measured.items():
+        durations[nodeid] = round((previous[nodeid] + seconds) / 2 if nodeid in previous else seconds, 3)
+    return durations
+
+
+def _read(path):
+    try:
+        with open(path) as filehandle:
+            return json.load(filehandle)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_durations(config):
+    """{nodeid: seconds} from previous runs (--appium_durations file, else the pytest cache)"""
+    if config.option.appium_durations:
+        return _read(config.option.appium_durations)
+    cache = getattr(config, 'cache', None)
+    return cache.get(DURATIONS_CACHE_KEY, {}) if cache is not None else {}
+
+
+def record_duration(config, report):
+    """Accumulate the setup, call and teardown time of each test"""
+    config.__dict__.setdefault('_appium_measured_durations', defaultdict(float))[report.nodeid] += report.duration
+
+
+def save_durations(config):
+    measured = getattr(config, '_appium_measured_durations', None)
+    if not measured:
+        return
+    path = config.option.appium_durations
+    if path:
+        # The durations file may be shared by shards running at the same time
+        with _file_lock(path + '.lock'):
+            durations = _merge(_read(path), measured)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as filehandle:
+                json.dump(durations, filehandle, indent=0, sort_keys=True)
+            os.replace(tmp_path, path)
+        return
+    cache = getattr(config, 'cache', None)
+    if cache is not None:
+        cache.set(DURATIONS_CACHE_KEY, _merge(cache.get(DURATIONS_CACHE_KEY, {}), measured))
+
+
+class DurationsPlugin():
+    """
+    Record the duration of every test and save them at the end of the run.
+    Registered on the xdist controller, which receives the reports of every worker.
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def pytest_runtest_logreport(self, report):
+        record_duration(self.config, report)
+
+    def pytest_sessionfinish(self, session):
+        save_durations(self.config)
+
+
+def expected_durations(nodeids, durations):
+    """
+    Duration of each test from previous runs. Tests without history are expected to take the median
+
+    >>> expected_durations(['a', 'b', 'new'], {'a': 10.0, 'b': 2.0, 'gone': 4.0})
+    {'a': 10.0, 'b': 2.0, 'new': 4.0}
+    """
+    known = [durations[nodeid] for nodeid in durations]
+    default = statistics.median(known) if known else DEFAULT_DURATION_SECONDS
+    return {nodeid: durations.get(nodeid, default) for nodeid in nodeids}
+
+
+def shard_nodeids(expected, count):
+    """
+    Split tests into `count` shards of about equal expected duration (longest processing time first).
+    Deterministic, so every shard computes the same split.
+
+    >>> shards = shard_nodeids({'a': 10, 'b': 6, 'c': 5, 'd': 4, 'e': 1}, 2)
+    >>> shards
+    [['a', 'd'], ['b', 'c', 'e']]
+    >>> [sum({'a': 10, 'b': 6, 'c': 5, 'd': 4, 'e': 1}[nodeid] for nodeid in shard) for shard in shards]
+    [14, 12]
+    """
+    loads = [0] * count
+    shards = [[] for _ in range(count)]
+    for nodeid, seconds in sorted(expected.items(), key=lambda item: (-item[1], item[0])):
+        index = min(range(count), key=lambda index: (loads[index], index))
+        loads[index] += seconds
+        shards[index].append(nodeid)
+    return shards
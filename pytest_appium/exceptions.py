@@ -0,0 +1,10 @@
+class HttpStatusError(Exception):
+    """An HTTP request to an Appium server returned an error status"""
+    def __init__(self, status, url):
+        super().__init__(f'HTTP {status} from {url}')
+        self.status = status
+        self.url = url
+
+
+class DevicePoolExhausted(Exception):
+    """No endpoint in the device pool is free (or alive) to lease"""
@@ -0,0 +1,202 @@
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+log = logging.getLogger(__name__)
+
+# 1x1 transparent png
+SCREENSHOT_PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=='
+)
+
+NO_SUCH_ELEMENT = 7
+
+PAGE_SOURCE = '''<?xml version="1.0" encoding="UTF-8"?>
+<hierarchy rotation="0" scroll="{swipes}">
+  <android.widget.FrameLayout index="0" class="android.widget.FrameLayout" bounds="[0,0][1080,1920]">
+    <android.widget.TextView index="0" text="Fake" resource-id="com.example:id/title" class="android.widget.TextView" bounds="[0,0][1080,100]"/>
+  </android.widget.FrameLayout>
+</hierarchy>'''
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like a real Appium server
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'null') if length else None
+        status, payload = self.server.json_server.dispatch(self.command, self.path, body)
+        data = json.dumps(payload).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+
+class JsonHttpServer():
+    """Threaded keep-alive HTTP server answering every request with `dispatch(method, path, body)`"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._httpd = _ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.json_server = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/wd/hub'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def dispatch(self, method, path, body):
+        """Return (http_status, json_payload) for a request"""
+        raise NotImplementedError()
+
+
+class FakeAppiumServer(JsonHttpServer):
+    """
+    In-process stand-in for an Appium server speaking the (JSON wire protocol) subset used by
+    pytest-appium and its driver extensions. Every request is delayed by `latency` seconds to
+    approximate the round trip to a real device.
+
+    elements: {locator_value: swipes} - the element can be found once `swipes` swipes have been performed.
+
+    >>> from pytest_appium._utils import get_json, post_json
+    >>> with FakeAppiumServer(elements={'com.example:id/title': 0}) as server:
+    ...     get_json(f'{server.url}/status')['value']['build']['version']
+    ...     session_id = post_json(f'{server.url}/session', {'desiredCapabilities': {}})['sessionId']
+    ...     post_json(f'{server.url}/session/{session_id}/element', {'using': 'id', 'value': 'com.example:id/title'})['status']
+    ...     post_json(f'{server.url}/session/{session_id}/element', {'using': 'id', 'value': 'missing'})['status']
+    ...     server.requests['findElement']
+    '1.0.0-fake'
+    0
+    7
+    2
+    """
+
+    def __init__(self, latency=0, elements=None, page_source=PAGE_SOURCE, window_size=(1080, 1920), host='127.0.0.1', port=0):
+        super().__init__(host, port)
+        self.latency = latency
+        self.elements = dict(elements or {})
+        self.page_source = page_source
+        self.window_size = {'width': window_size[0], 'height': window_size[1]}
+        self.swipes = 0
+        self.requests = Counter()
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self.routes = [
+            ('GET', r'/status', 'status', self._status),
+            ('POST', r'/session', 'newSession', self._new_session),
+            ('DELETE', r'/session/(?P<session_id>[^/]+)', 'quit', self._quit),
+            ('POST', r'/session/[^/]+/element', 'findElement', self._find_element),
+            ('POST', r'/session/[^/]+/elements', 'findElements', self._find_elements),
+            ('GET', r'/session/[^/]+/element/[^/]+/size', 'getElementSize', lambda body: {'width': 1080, 'height': 400}),
+            ('GET', r'/session/[^/]+/element/[^/]+/location', 'getElementLocation', lambda body: {'x': 0, 'y': 200}),
+            ('GET', r'/session/[^/]+/element/[^/]+/rect', 'getElementRect', lambda body: {'x': 0, 'y': 200, 'width': 1080, 'height': 400}),
+            ('GET', r'/session/[^/]+/window/[^/]+/size', 'getWindowSize', lambda body: self.window_size),
+            ('GET', r'/session/[^/]+/window/rect', 'getWindowRect', lambda body: {'x': 0, 'y': 0, **self.window_size}),
+            ('GET', r'/session/[^/]+/orientation', 'getScreenOrientation', lambda body: 'PORTRAIT'),
+            ('GET', r'/session/[^/]+/source', 'getPageSource', lambda body: self.page_source.format(swipes=self.swipes)),
+            ('GET', r'/session/[^/]+/screenshot', 'screenshot', lambda body: base64.b64encode(SCREENSHOT_PNG).decode('ascii')),
+            ('POST', r'/session/[^/]+/touch/perform', 'touchAction', self._swipe),
+            ('POST', r'/session/[^/]+/actions', 'w3cActions', self._actions),
+            ('POST', r'/session/[^/]+/appium/app/strings', 'getAppStrings', lambda body: {'title': 'Fake'}),
+            ('GET', r'/session/[^/]+/log/types', 'getAvailableLogTypes', lambda body: ['logcat']),
+            ('POST', r'/session/[^/]+/log', 'getLog', lambda body: []),
+        ]
+        self._routes = [(method, re.compile(f'(?:/wd/hub)?{path}$'), name, handler) for method, path, name, handler in self.routes]
+
+    def dispatch(self, method, path, body):
+        if self.latency:
+            time.sleep(self.latency)
+        path = path.split('?')[0].rstrip('/')
+        for route_method, pattern, name, handler in self._routes:
+            match = pattern.match(path)
+            if route_method == method and match:
+                with self._lock:
+                    self.requests[name] += 1
+                result = handler(body, **match.groupdict())
+                if isinstance(result, tuple):
+                    return result
+                return 200, {'status': 0, 'sessionId': match.groupdict().get('session_id'), 'value': result}
+        with self._lock:
+            self.requests[f'{method} {path}'] += 1
+        return 200, {'status': 0, 'value': None}
+
+    def _status(self, body):
+        return {'build': {'version': '1.0.0-fake'}}
+
+    def _new_session(self, body):
+        session_id = str(uuid.uuid4())
+        capabilities = dict((body or {}).get('desiredCapabilities') or {})
+        with self._lock:
+            self.sessions[session_id] = capabilities
+        return 200, {'status': 0, 'sessionId': session_id, 'value': capabilities}
+
+    def _quit(self, body, session_id):
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    def _found(self, body):
+        value = (body or {}).get('value') or ''
+        if '.scrollIntoView(' in value:
+            return any(element in value for element in self.elements)  # scrolled to on the device
+        swipes = self.elements.get(value)
+        return swipes is not None and self.swipes >= swipes
+
+    def _find_element(self, body):
+        if not self._found(body):
+            return 200, {'status': NO_SUCH_ELEMENT, 'value': {'message': 'An element could not be located on the page using the given search parameters.'}}
+        return self._element(body)
+
+    def _find_elements(self, body):
+        return [self._element(body)] if self._found(body) else []
+
+    def _element(self, body):
+        return {'ELEMENT': hashlib.md5(body['value'].encode('utf8')).hexdigest()}
+
+    def _swipe(self, body):
+        with self._lock:
+            self.swipes += 1
+
+    def _actions(self, body):
+        releases = sum(
+            action['type'] == 'pointerUp'
+            for source in (body or {}).get('actions', ())
+            for action in source.get('actions', ())
+        )
+        with self._lock:
+            self.swipes += releases
@@ -3,5 +3,13 @@ def pytest_appium_capture_debug(item, report, extra):
     """ Called when gathering debug information for the HTML report. """
 
 
+def pytest_appium_debug_gatherers(item):
+    """
+    Return a dict of {name: gatherer} to run concurrently with the builtin debug gatherers.
+    A gatherer is called as gatherer(item, report, driver, summary, extra).
+    Names listed in `appium_exclude_debug` are skipped.
+    """
+
+
 def pytest_appium_runtest_makereport(item, report, summary, extra):
     """ Called when making the HTML report. """
@@ -1,36 +1,83 @@
 import pytest
+import base64
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 
+from .artifact_store import get_artifact_store, report_dir
+from .screenshots import get_screenshot_options, get_screenshot_pipeline, transcode
+
+
+def _app_strings(config, driver):
+    """
+    app_strings do not change within a session.
+    Fetch them once per driver session and language and write them once as a shared report artifact.
+    Returns (app_strings, path_to_artifact_relative_to_the_report)
+    """
+    cache = config.__dict__.setdefault('_appium_app_strings', {})
+    language = driver.capabilities.get('language')
+    key = (driver.session_id, language)
+    if key not in cache:
+        app_strings = driver.app_strings(language) if language else driver.app_strings()
+        path = None
+        artifact_store = get_artifact_store(config)
+        if artifact_store:
+            path = artifact_store.put(json.dumps(app_strings, indent=2, sort_keys=True), 'json')
+        cache[key] = (app_strings, path)
+    return cache[key]
+
 
 def _gather_app_strings(item, report, driver, summary, extra):
-    """Add app_strings to the html report (if set in commandline)"""
+    """Link the session app_strings in the html report and inline the keys set in commandline"""
     try:
-        app_strings = driver.app_strings()
+        app_strings, path = _app_strings(item.config, driver)
     except Exception as e:
         summary.append('WARNING: Failed to gather app_strings: {0}'.format(e))
         return
 
     pytest_html = item.config.pluginmanager.getplugin('html')
-    if pytest_html is not None:
-        extra.append(pytest_html.extras.json(app_strings, 'app_strings'))
+    if pytest_html is not None and path:
+        extra.append(pytest_html.extras.url(path, 'app_strings'))
 
     app_string_keys = item.config.getoption('appium_debug_app_string_key')
     if app_string_keys:
         app_strings = {k: v for k, v in app_strings.items() if k in app_string_keys}
         summary.append('APP_STRINGS: {0}'.format(app_strings))
+        if pytest_html is not None:
+            extra.append(pytest_html.extras.json(app_strings, 'app_strings (selected)'))
 
 
 def _gather_screenshot(item, report, driver, summary, extra):
+    artifact_store = get_artifact_store(item.config)
+    options = get_screenshot_options(item.config)
     try:
-        screenshot = driver.get_screenshot_as_base64()
+        if artifact_store or options.transcodes:
+            screenshot = driver.get_screenshot_as_png()
+        else:
+            screenshot = driver.get_screenshot_as_base64()
     except Exception as e:
         summary.append('WARNING: Failed to gather screenshot: {0}'.format(e))
         return
     pytest_html = item.config.pluginmanager.getplugin('html')
     if pytest_html is not None:
         # add screenshot to the html report
-        extra.append(pytest_html.extras.image(screenshot, 'Screenshot'))
+        if artifact_store:
+            # Transcoded and written in the background, the path is known up front
+            path = get_screenshot_pipeline(item.config, artifact_store).put(screenshot)
+            href = artifact_store.put(screenshot, 'png') if options.keep_original and options.transcodes else path
+            extra.append(pytest_html.extras.html(
+                '<div class="image"><a href="{0}"><img src="{1}"/></a></div>'.format(href, path)
+            ))
+        elif options.transcodes:
+            data, extension = transcode(screenshot, options)
+            extra.append(pytest_html.extras.image(
+                base64.b64encode(data).decode('ascii'), 'Screenshot', mime_type='image/{0}'.format(extension), extension=extension,
+            ))
+            if options.keep_original:
+                extra.append(pytest_html.extras.image(base64.b64encode(screenshot).decode('ascii'), 'Screenshot (original)'))
+        else:
+            extra.append(pytest_html.extras.image(screenshot, 'Screenshot'))
 
 
 def _gather_page_source(item, report, driver, summary, extra):
@@ -41,6 +88,10 @@ def _gather_page_source(item, report, driver, summary, extra):
         return
     pytest_html = item.config.pluginmanager.getplugin('html')
     if pytest_html is not None:
+        artifact_store = get_artifact_store(item.config)
+        if artifact_store:
+            extra.append(pytest_html.extras.url(artifact_store.put(page_source, 'xml'), 'UI'))
+            return
         # Add page source to the html report
         #   There is no `.xml(` output, so we create our own `.extra`
         extra.append(
@@ -52,6 +103,10 @@ def _gather_page_source(item, report, driver, summary, extra):
 
 
 def _gather_logs(item, report, driver, summary, extra):
+    log_collector = getattr(driver, '_appium_log_collector', None)
+    if log_collector is not None:
+        _gather_streamed_logs(item, log_collector, extra)
+        return
     try:
         types = driver.log_types
     except Exception as e:
@@ -74,6 +129,15 @@ def _gather_logs(item, report, driver, summary, extra):
             )
 
 
+def _gather_streamed_logs(item, log_collector, extra):
+    """Link the per-test slice of the streamed logs"""
+    pytest_html = item.config.pluginmanager.getplugin('html')
+    _report_dir = report_dir(item.config)
+    for name, path in log_collector.end_test(item.nodeid).items():
+        if pytest_html is not None:
+            extra.append(pytest_html.extras.url(os.path.relpath(path, _report_dir), '%s Log' % name.title()))
+
+
 def format_log(log):
     timestamp_format = '%Y-%m-%d %H:%M:%S.%f'
     entries = [u'{0} {1[level]} - {1[message]}'.format(
@@ -97,6 +161,55 @@ def split_class_and_test_names(nodeid):
 
 
 
+DEBUG_GATHERERS = {
+    'app_strings': _gather_app_strings,
+    'screenshot': _gather_screenshot,
+    'page_source': _gather_page_source,
+    'logs': _gather_logs,
+}
+
+
+def _gather_capture_debug_hook(item, report, driver, summary, extra):
+    """Legacy `pytest_appium_capture_debug` hook implementations run as a single gatherer"""
+    item.config.hook.pytest_appium_capture_debug(item=item, report=report, extra=extra)
+
+
+def gather_debug(item, report, driver, summary, extra, gatherers, timeout):
+    """
+    Run each gatherer concurrently in it's own thread.
+    Each gatherer writes to it's own summary/extra so the report order is stable regardless of completion order.
+    Gatherers that do not complete within `timeout` seconds are abandoned with a warning.
+
+    >>> from time import sleep
+    >>> def _quick(item, report, driver, summary, extra):
+    ...     extra.append('quick')
+    >>> def _slow(item, report, driver, summary, extra):
+    ...     sleep(1)
+    ...     extra.append('slow')
+    >>> summary, extra = [], []
+    >>> gather_debug(None, None, None, summary, extra, {'slow': _slow, 'quick': _quick}, timeout=0.1)
+    >>> summary, extra
+    (['WARNING: Timed out gathering slow after 0.1 seconds'], ['quick'])
+    """
+    results = {name: ([], []) for name in gatherers}
+    executor = ThreadPoolExecutor(max_workers=max(len(gatherers), 1))
+    futures = {
+        name: executor.submit(gatherer, item, report, driver, *results[name])
+        for name, gatherer in gatherers.items()
+    }
+    wait(futures.values(), timeout=timeout)
+    executor.shutdown(wait=False)
+    for name, future in futures.items():
+        _summary, _extra = results[name]
+        if not future.done():
+            summary.append('WARNING: Timed out gathering {0} after {1} seconds'.format(name, timeout))
+            continue
+        if future.exception():
+            summary.append('WARNING: Failed to gather {0}: {1}'.format(name, future.exception()))
+        summary.extend(_summary)
+        extra.extend(_extra)
+
+
 class AppiumReportPlugin(object):
 
     @pytest.mark.hookwrapper
@@ -112,18 +225,23 @@ class AppiumReportPlugin(object):
         capture_debug = when == 'always' or (when == 'failure' and failure)
         if driver is not None:
             if capture_debug:
-                exclude = item.config.getini('appium_exclude_debug').lower()
-                if 'app_strings' not in exclude:
-                    _gather_app_strings(item, report, driver, summary, extra)
-                if 'screenshot' not in exclude:
-                    _gather_screenshot(item, report, driver, summary, extra)
-                if 'page_source' not in exclude:
-                    _gather_page_source(item, report, driver, summary, extra)
-                if 'logs' not in exclude:
-                    _gather_logs(item, report, driver, summary, extra)
-                item.config.hook.pytest_appium_capture_debug(item=item, report=report, extra=extra)
+                exclude = (item.config.getini('appium_exclude_debug') or '').lower()
+                gatherers = dict(DEBUG_GATHERERS)
+                for _gatherers in item.config.hook.pytest_appium_debug_gatherers(item=item):
+                    gatherers.update(_gatherers)
+                gatherers['capture_debug_hook'] = _gather_capture_debug_hook
+                gatherers = {name: gatherer for name, gatherer in gatherers.items() if name not in exclude}
+                gather_debug(
+                    item, report, driver, summary, extra, gatherers,
+                    timeout=float(item.config.getini('appium_capture_debug_timeout')),
+                )
             item.config.hook.pytest_appium_runtest_makereport(item=item, report=report, summary=summary, extra=extra)
+        command_recorder = getattr(item.config, '_appium_command_recorder', None)
+        if command_recorder is not None and report.when == 'call' and command_recorder.tests.get(item.nodeid):
+            report.sections.append((
+                'appium command latency',
+                '\n'.join(command_recorder.summary_lines(command_recorder.tests[item.nodeid])),
+            ))
         if summary:
             report.sections.append(('pytest-appium', '\n'.join(summary)))
         report.extra = extra
-
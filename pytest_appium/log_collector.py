@@ -0,0 +1,168 @@
+import logging
+import os
+import re
+import threading
+import time
+
+from .artifact_store import report_dir
+from .html_reporting import format_log
+
+
+log = logging.getLogger(__name__)
+
+LEVELS = ('ALL', 'DEBUG', 'INFO', 'WARNING', 'SEVERE')
+
+
+def _safe_filename(nodeid):
+    """
+    >>> _safe_filename('tests/test_app.py::TestApp::()::test_launch[android]')
+    'tests_test_app.py__TestApp______test_launch_android_'
+    """
+    return re.sub(r'[^\w.-]', '_', nodeid)
+
+
+class LogCollector(threading.Thread):
+    """
+    Drain the device logs continuously in the background and stream them to one file per test and log type.
+
+    Entries are routed to tests by timestamp: `begin_test()` records the start of each test and every entry
+    from then on is written to that test's file. Nothing is buffered beyond a single `get_log()` batch.
+
+    Note: Test boundaries are recorded with the host clock; a large skew against the device clock
+    will shift entries into neighbouring tests.
+
+    >>> import tempfile
+    >>> from unittest.mock import MagicMock
+    >>> driver = MagicMock(log_types=['logcat'])
+    >>> driver.get_log.side_effect = [
+    ...     [{'timestamp': 1000, 'level': 'INFO', 'message': 'I MyApp: before'}],
+    ...     [{'timestamp': 5000, 'level': 'DEBUG', 'message': 'D MyApp: too quiet'},
+    ...      {'timestamp': 5001, 'level': 'INFO', 'message': 'I Other: not my tag'},
+    ...      {'timestamp': 5002, 'level': 'SEVERE', 'message': 'E MyApp: boom'}],
+    ... ]
+    >>> collector = LogCollector(driver, tempfile.mkdtemp(), min_level='INFO', tags=('MyApp',))
+    >>> collector.begin_test('test_a', timestamp=2000)
+    >>> paths = collector.end_test('test_a')
+    >>> print(open(paths['logcat']).read().strip())
+    1970-01-01 00:00:05.002000 SEVERE - E MyApp: boom
+    >>> print(open(os.path.join(collector.log_dir, 'session.logcat.log')).read().strip())
+    1970-01-01 00:00:01.000000 INFO - I MyApp: before
+    """
+
+    def __init__(self, driver, log_dir, poll_seconds=2, min_level=None, tags=(), nodeid='session'):
+        super().__init__(name='pytest-appium-log-collector', daemon=True)
+        self.driver = driver
+        self.log_dir = log_dir
+        self.poll_seconds = poll_seconds
+        self.min_level = LEVELS.index(min_level.upper()) if min_level else 0
+        self.tag_pattern = re.compile('|'.join(tags)) if tags else None
+        self.log_types = tuple(driver.log_types)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._boundaries = [(0, nodeid)]
+        self._files = {}
+        os.makedirs(log_dir, exist_ok=True)
+
+    def path(self, nodeid, log_type):
+        return os.path.join(self.log_dir, f'{_safe_filename(nodeid)}.{log_type}.log')
+
+    def _keep(self, entry):
+        level = entry.get('level', 'ALL').upper()
+        if level in LEVELS and LEVELS.index(level) < self.min_level:
+            return False
+        if self.tag_pattern and not self.tag_pattern.search(entry.get('message', '')):
+            return False
+        return True
+
+    def _nodeid_for(self, timestamp):
+        for start, nodeid in reversed(self._boundaries):
+            if timestamp >= start:
+                return nodeid
+        return self._boundaries[0][1]
+
+    def _write(self, nodeid, log_type, entries):
+        key = (nodeid, log_type)
+        if key not in self._files:
+            self._files[key] = open(self.path(nodeid, log_type), 'a')
+        self._files[key].write(format_log(entries) + '\n')
+        self._files[key].flush()
+
+    def _drain(self):
+        for log_type in self.log_types:
+            try:
+                entries = self.driver.get_log(log_type)
+            except Exception as ex:
+                log.debug(f'Failed to drain {log_type} log: {ex}')
+                continue
+            routed = {}
+            for entry in filter(self._keep, entries):
+                routed.setdefault(self._nodeid_for(entry['timestamp']), []).append(entry)
+            for nodeid, _entries in routed.items():
+                self._write(nodeid, log_type, _entries)
+        # Entries arrive in order; older tests can no longer receive entries
+        for _, nodeid in self._boundaries[:-1]:
+            self._close(nodeid)
+        del self._boundaries[:-1]
+
+    def _close(self, nodeid):
+        for key in [key for key in self._files if key[0] == nodeid]:
+            self._files.pop(key).close()
+
+    def run(self):
+        while not self._stop_event.wait(self.poll_seconds):
+            with self._lock:
+                self._drain()
+
+    def begin_test(self, nodeid, timestamp=None):
+        with self._lock:
+            self._drain()
+            self._boundaries.append((timestamp or time.time() * 1000, nodeid))
+
+    def end_test(self, nodeid):
+        """Drain up to now and return {log_type: path} of the files written for this test"""
+        with self._lock:
+            self._drain()
+            return {
+                log_type: self.path(nodeid, log_type)
+                for log_type in self.log_types
+                if os.path.exists(self.path(nodeid, log_type))
+            }
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        with self._lock:
+            self._drain()
+            for nodeid in {key[0] for key in self._files}:
+                self._close(nodeid)
+
+
+def start_log_collector(driver, request):
+    """Start streaming the logs of `driver` (if --appium_stream_logs and an html report directory are set)"""
+    config = request.config
+    _report_dir = report_dir(config)
+    if not config.option.appium_stream_logs or not _report_dir:
+        return None
+    try:
+        collector = LogCollector(
+            driver,
+            log_dir=os.path.join(_report_dir, 'appium', 'logs'),
+            poll_seconds=config.option.appium_log_poll_seconds,
+            min_level=config.option.appium_log_level,
+            tags=config.option.appium_log_tag,
+            nodeid=getattr(request.node, 'nodeid', '') or 'session',
+        )
+    except Exception as ex:
+        # note that some drivers may not implement log types
+        log.warning(f'Unable to stream device logs: {ex}')
+        return None
+    collector.start()
+    driver._appium_log_collector = collector
+    config.__dict__.setdefault('_appium_log_collectors', []).append(collector)
+    return collector
+
+
+def stop_log_collector(collector, config):
+    collector.stop()
+    config._appium_log_collectors.remove(collector)
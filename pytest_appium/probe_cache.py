@@ -0,0 +1,81 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'pytest_appium_probe_cache')
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock shared between processes (xdist workers). A no-op where fcntl is unavailable"""
+    with open(path, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def cached_probe(key, probe, ttl, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Return the result of `probe()` shared between processes for `ttl` seconds.
+
+    Only one process runs the probe at a time; the others block on the lock and then read its result.
+    Only positive results are cached so a device that is still booting is re-probed promptly.
+
+    >>> cache_dir = tempfile.mkdtemp()
+    >>> calls = []
+    >>> probe = lambda: calls.append(1) or True
+    >>> cached_probe('android http://a:4723/wd/hub', probe, ttl=30, cache_dir=cache_dir)
+    True
+    >>> cached_probe('android http://a:4723/wd/hub', probe, ttl=30, cache_dir=cache_dir)
+    True
+    >>> len(calls)
+    1
+    >>> cached_probe('android http://b:4723/wd/hub', lambda: False, ttl=30, cache_dir=cache_dir)
+    False
+    """
+    if not ttl:
+        return probe()
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+    with _file_lock(path + '.lock'):
+        try:
+            with open(path) as filehandle:
+                cached = json.load(filehandle)
+            if time.time() - cached['time'] < ttl:
+                log.debug(f'Using cached probe result for {key}')
+                return cached['result']
+        except (OSError, ValueError, KeyError):
+            pass
+        result = probe()
+        if result:
+            with open(path, 'w') as filehandle:
+                json.dump({'key': key, 'time': time.time(), 'result': result}, filehandle)
+        return result
+
+
+def cache_probes(probes, names, ttl, cache_dir=DEFAULT_CACHE_DIR):
+    """Wrap the named readiness probes {name: func(appium_url, timeout)} with `cached_probe` keyed by endpoint"""
+    def _cached(name, probe):
+        def _probe(appium_url, timeout=None):
+            return cached_probe(f'{name} {appium_url}', lambda: probe(appium_url, timeout=timeout), ttl, cache_dir)
+        return _probe
+    return {
+        name: _cached(name, probe) if name in names else probe
+        for name, probe in probes.items()
+    }
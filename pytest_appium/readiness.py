@@ -0,0 +1,63 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+
+
+log = logging.getLogger(__name__)
+
+BACKOFF_INITIAL_SECONDS = 0.25
+BACKOFF_FACTOR = 2
+BACKOFF_MAX_SECONDS = 5
+
+
+def _backoff():
+    """
+    >>> from itertools import islice
+    >>> list(islice(_backoff(), 7))
+    [0.25, 0.5, 1.0, 2.0, 4.0, 5, 5]
+    """
+    interval = BACKOFF_INITIAL_SECONDS
+    while True:
+        yield interval
+        interval = min(interval * BACKOFF_FACTOR, BACKOFF_MAX_SECONDS)
+
+
+def wait_until_ready(appium_url, probes, conditions, seconds_to_wait, probe_timeout):
+    """
+    Probe each condition concurrently with exponential backoff until all are satisfied.
+    Every probe is bounded by `probe_timeout` and by the time left before `seconds_to_wait` expires.
+
+    probes: {condition_name: func(appium_url, timeout=seconds)}
+    Returns {condition_name: seconds_until_ready}
+
+    >>> attempts = iter([False, False, True])
+    >>> probes = {'up': lambda url, timeout: True, 'device': lambda url, timeout: next(attempts)}
+    >>> sorted(wait_until_ready('http://localhost:4723/wd/hub', probes, ['up', 'device'], 5, 1))
+    ['device', 'up']
+    >>> wait_until_ready('http://localhost:4723/wd/hub', {'never': lambda url, timeout: False}, ['never'], 0.1, 1)
+    Traceback (most recent call last):
+    ...
+    Exception: Server not ready. Failed to wait on never for 0.1 seconds for Appium server http://localhost:4723/wd/hub
+    """
+    start = monotonic()
+    expire = start + seconds_to_wait
+
+    def _wait(condition):
+        for attempt, interval in enumerate(_backoff(), 1):
+            remaining = expire - monotonic()
+            try:
+                if probes[condition](appium_url, timeout=max(min(probe_timeout, remaining), 0.1)):
+                    seconds_until_ready = monotonic() - start
+                    log.info(f'{condition} ready after {seconds_until_ready:.2f} seconds ({attempt} probes) for Appium server {appium_url}')
+                    return seconds_until_ready
+            except Exception as ex:
+                log.debug(f'{condition} probe {attempt} failed for Appium server {appium_url}: {ex}')
+            remaining = expire - monotonic()
+            if remaining <= 0:
+                raise Exception(f'Server not ready. Failed to wait on {condition} for {seconds_to_wait} seconds for Appium server {appium_url}')
+            sleep(min(interval, remaining))
+
+    with ThreadPoolExecutor(max_workers=len(conditions)) as executor:
+        seconds_until_ready = dict(zip(conditions, executor.map(_wait, conditions)))
+    log.info(f'Appium server {appium_url} ready after {monotonic() - start:.2f} seconds: {seconds_until_ready}')
+    return seconds_until_ready
@@ -0,0 +1,170 @@
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import defaultdict, deque
+
+from ._utils import worker_path
+from .fake_server import JsonHttpServer
+
+
+log = logging.getLogger(__name__)
+
+WD_HUB = '/wd/hub'
+UNKNOWN_ERROR = 13
+
+
+def _request_key(method, path, body):
+    return (method, path, json.dumps(body, sort_keys=True) if body is not None else None)
+
+
+def _new_session_response(driver):
+    """Response to the newSession command issued by the driver constructor (before it could be recorded)"""
+    if driver.w3c:
+        return {'value': {'sessionId': driver.session_id, 'capabilities': driver.capabilities}}
+    return {'status': 0, 'sessionId': driver.session_id, 'value': driver.capabilities}
+
+
+class SessionRecorder():
+    """
+    Record the HTTP command/response stream of driver sessions to a gzipped json lines file.
+    Each line is `[method, path_relative_to_the_server_url, body, response]`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def record(self, method, path, body, response):
+        line = json.dumps([method, path, body, response], separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+            self.count += 1
+
+    def record_driver(self, driver):
+        command_executor = driver.command_executor
+        if getattr(command_executor, '_appium_recorded', False):
+            return
+        server_url = command_executor._url
+        self.record('POST', '/session', None, _new_session_response(driver))
+        _request = command_executor._request
+
+        def _recording_request(method, url, body=None):
+            response = _request(method, url, body=body)
+            self.record(
+                method,
+                url[len(server_url):] if url.startswith(server_url) else url,
+                json.loads(body) if body and method in ('POST', 'PUT') else None,
+                response,
+            )
+            return response
+        command_executor._request = _recording_request
+        command_executor._appium_recorded = True
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ReplayServer(JsonHttpServer):
+    """
+    Serve a recorded command/response stream back to `webdriver.Remote` without a device.
+
+    Responses to the same request (method, path and body) are served in recorded order, the last one
+    is repeated once they run out. A request not recorded with that body falls back to the responses
+    recorded for the same method and path.
+
+    >>> import tempfile
+    >>> from pytest_appium._utils import get_json, post_json
+    >>> path = os.path.join(tempfile.mkdtemp(), 'session.jsonl.gz')
+    >>> recorder = SessionRecorder(path)
+    >>> recorder.record('GET', '/session/1/source', None, {'status': 0, 'value': '<a/>'})
+    >>> recorder.record('GET', '/session/1/source', None, {'status': 0, 'value': '<b/>'})
+    >>> recorder.record('POST', '/session/1/element', {'using': 'id', 'value': 'x'}, {'status': 0, 'value': {'ELEMENT': '1'}})
+    >>> recorder.close()
+    >>> with ReplayServer(path) as server:
+    ...     [get_json(f'{server.url}/session/1/source')['value'] for _ in range(3)]
+    ...     post_json(f'{server.url}/session/1/element', {'using': 'id', 'value': 'y'})['value']
+    ...     post_json(f'{server.url}/session/1/click', {})['status'], server.misses
+    ['<a/>', '<b/>', '<b/>']
+    {'ELEMENT': '1'}
+    (13, 1)
+    """
+
+    def __init__(self, path, host='127.0.0.1', port=0):
+        super().__init__(host, port)
+        self.path = path
+        self.misses = 0
+        self._responses = defaultdict(deque)
+        self._fallback_responses = defaultdict(deque)
+        self._lock = threading.Lock()
+        with gzip.open(path, 'rt', encoding='utf-8') as filehandle:
+            for line in filehandle:
+                method, _path, body, response = json.loads(line)
+                self._responses[_request_key(method, _path, body)].append(response)
+                self._fallback_responses[(method, _path)].append(response)
+
+    @staticmethod
+    def _next(responses, key):
+        queue = responses.get(key)
+        if not queue:
+            return None
+        return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def dispatch(self, method, path, body):
+        path = path.split('?')[0]
+        if path.startswith(WD_HUB):
+            path = path[len(WD_HUB):]
+        with self._lock:
+            response = self._next(self._responses, _request_key(method, path, body))
+            if response is None:
+                response = self._next(self._fallback_responses, (method, path))
+            if response is None:
+                self.misses += 1
+        if response is None:
+            log.warning(f'{method} {path} was not recorded in {self.path}')
+            return 200, {'status': UNKNOWN_ERROR, 'value': {'message': f'{method} {path} was not recorded in {self.path}'}}
+        return 200, response
+
+
+def get_session_recorder(config):
+    """Return the session `SessionRecorder` (or None when not recording)"""
+    if not config.option.appium_record:
+        return None
+    if not hasattr(config, '_appium_session_recorder'):
+        config._appium_session_recorder = SessionRecorder(worker_path(config, config.option.appium_record))
+    return config._appium_session_recorder
+
+
+def record_driver(driver, config):
+    recorder = get_session_recorder(config)
+    if recorder is not None:
+        recorder.record_driver(driver)
+    return driver
+
+
+def get_replay_server(config):
+    """Return the started `ReplayServer` (or None when not replaying). An xdist worker replays its own recording when there is one"""
+    if not config.option.appium_replay:
+        return None
+    if not hasattr(config, '_appium_replay_server'):
+        path = worker_path(config, config.option.appium_replay)
+        if not os.path.exists(path):
+            path = config.option.appium_replay
+        config._appium_replay_server = ReplayServer(path).start()
+    return config._appium_replay_server
+
+
+def stop_record_replay(config):
+    recorder = getattr(config, '_appium_session_recorder', None)
+    if recorder is not None:
+        recorder.close()
+        log.info(f'Recorded {recorder.count} Appium requests to {recorder.path}')
+    replay_server = getattr(config, '_appium_replay_server', None)
+    if replay_server is not None:
+        replay_server.stop()
+        if replay_server.misses:
+            log.warning(f'{replay_server.misses} Appium requests were not found in {replay_server.path}')
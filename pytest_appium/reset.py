@@ -0,0 +1,87 @@
+import logging
+from collections import defaultdict
+from time import monotonic
+
+from ._utils import get_marker
+
+
+log = logging.getLogger(__name__)
+
+
+def _app_id(driver):
+    capabilities = driver.capabilities
+    return capabilities.get('appPackage') or capabilities.get('bundleId')
+
+
+def _restart_app(driver):
+    """Terminate and activate the app under test. Keeps app data"""
+    app_id = _app_id(driver)
+    assert app_id, 'restart reset requires an appPackage or bundleId capability'
+    driver.terminate_app(app_id)
+    driver.activate_app(app_id)
+
+
+def _clear_app(driver):
+    """Clear app data and restart the app (Appium `reset`)"""
+    driver.reset()
+
+
+def _new_session(driver):
+    """Quit and start a fresh session on the same driver object"""
+    driver.quit()
+    driver.start_session(driver._appium_desired_capabilities)
+
+
+RESET_STRATEGIES = {
+    'none': lambda driver: None,
+    'restart': _restart_app,
+    'clear': _clear_app,
+    'session': _new_session,
+}
+
+
+def reset_strategy(item):
+    """Strategy from the `appium_reset` marker, else --appium_reset"""
+    marker = get_marker(item, 'appium_reset')
+    if marker and marker.args:
+        strategy = marker.args[0]
+        assert strategy in RESET_STRATEGIES, f'Unknown appium_reset strategy {strategy}. Should be one of {tuple(RESET_STRATEGIES)}'
+        return strategy
+    return item.config.option.appium_reset
+
+
+def reset_driver(driver, strategy, config):
+    """
+    Reset app state with `strategy` and record how long it took.
+
+    >>> from unittest.mock import MagicMock
+    >>> config = MagicMock(spec=[])
+    >>> driver = MagicMock(capabilities={'appPackage': 'com.example'})
+    >>> reset_driver(driver, 'restart', config)
+    >>> driver.terminate_app.assert_called_with('com.example')
+    >>> driver.activate_app.assert_called_with('com.example')
+    >>> reset_driver(driver, 'none', config)
+    >>> sorted(config._appium_reset_timings)
+    ['none', 'restart']
+    """
+    start = monotonic()
+    RESET_STRATEGIES[strategy](driver)
+    seconds = monotonic() - start
+    log.debug(f'appium_reset {strategy} took {seconds:.2f} seconds')
+    config.__dict__.setdefault('_appium_reset_timings', defaultdict(list))[strategy].append(seconds)
+
+
+def reset_summary(config):
+    """
+    Lines summarising the measured cost of each reset strategy
+
+    >>> from unittest.mock import MagicMock
+    >>> config = MagicMock(spec=[])
+    >>> config._appium_reset_timings = {'restart': [1.0, 3.0]}
+    >>> reset_summary(config)
+    ['appium_reset restart: 2 resets, mean 2.00s, max 3.00s, total 4.00s']
+    """
+    return [
+        f'appium_reset {strategy}: {len(timings)} resets, mean {sum(timings) / len(timings):.2f}s, max {max(timings):.2f}s, total {sum(timings):.2f}s'
+        for strategy, timings in sorted(getattr(config, '_appium_reset_timings', {}).items())
+    ]
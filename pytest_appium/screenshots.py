@@ -0,0 +1,178 @@
+import hashlib
+import io
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None  # Pillow is optional; without it screenshots are reported as captured (full size png)
+
+
+log = logging.getLogger(__name__)
+
+FORMATS = {'png': 'PNG', 'jpeg': 'JPEG', 'webp': 'WEBP'}
+
+
+class ScreenshotOptions(namedtuple('ScreenshotOptions', ('format', 'max_dimension', 'quality', 'grayscale', 'keep_original'))):
+    """
+    How report screenshots are transcoded (see the `appium_screenshot_*` ini options)
+
+    >>> ScreenshotOptions('png', 0, 75, False, False).transcodes
+    False
+    >>> ScreenshotOptions('jpeg', 1280, 75, False, False).key
+    'jpeg-1280-75-color'
+    """
+
+    @property
+    def transcodes(self):
+        return Image is not None and (self.format != 'png' or bool(self.max_dimension) or self.grayscale)
+
+    @property
+    def extension(self):
+        return self.format if self.transcodes else 'png'
+
+    @property
+    def key(self):
+        return '{0}-{1}-{2}-{3}'.format(self.format, self.max_dimension, self.quality, 'gray' if self.grayscale else 'color')
+
+
+def _ini_bool(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def screenshot_options(config):
+    _format = config.getini('appium_screenshot_format').strip().lower()
+    if _format not in FORMATS:
+        raise ValueError('appium_screenshot_format should be one of {0}, not {1}'.format(tuple(FORMATS), _format))
+    return ScreenshotOptions(
+        format=_format,
+        max_dimension=int(config.getini('appium_screenshot_max_dimension') or 0),
+        quality=int(config.getini('appium_screenshot_quality')),
+        grayscale=_ini_bool(config.getini('appium_screenshot_grayscale')),
+        keep_original=_ini_bool(config.getini('appium_screenshot_keep_original')),
+    )
+
+
+def _scaled_size(size, max_dimension):
+    """
+    Fit (width, height) within max_dimension keeping the aspect ratio
+
+    >>> _scaled_size((2048, 1536), 1024)
+    (1024, 768)
+    >>> _scaled_size((1080, 2340), 1280)
+    (591, 1280)
+    >>> _scaled_size((640, 480), 1280)
+    (640, 480)
+    """
+    width, height = size
+    if not max_dimension or max(width, height) <= max_dimension:
+        return size
+    scale = max_dimension / max(width, height)
+    return (max(1, round(width * scale)), max(1, round(height * scale)))
+
+
+def transcode(png, options):
+    """
+    Downscale/convert a png screenshot. Returns (data, extension)
+    Without Pillow (or with options that change nothing) the png is returned untouched.
+    """
+    if not options.transcodes:
+        return png, 'png'
+    image = Image.open(io.BytesIO(png))
+    size = _scaled_size(image.size, options.max_dimension)
+    if size != image.size:
+        image = image.resize(size, Image.BILINEAR)
+    if options.grayscale:
+        image = image.convert('L')
+    elif options.format == 'jpeg' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')  # jpeg has no alpha channel
+    output = io.BytesIO()
+    if options.format == 'png':
+        image.save(output, 'PNG', optimize=False)
+    else:
+        image.save(output, FORMATS[options.format], quality=options.quality)
+    return output.getvalue(), options.format
+
+
+class ScreenshotPipeline():
+    """
+    Transcode screenshots and write them to the `ArtifactStore` in background threads.
+
+    `put` returns the artifact path immediately (derived from the captured png and the options) so the
+    report can link it while the image is still being encoded. `close` waits for the outstanding writes.
+
+    >>> import os, tempfile
+    >>> from pytest_appium.artifact_store import ArtifactStore
+    >>> from pytest_appium.fake_server import SCREENSHOT_PNG
+    >>> store = ArtifactStore(tempfile.mkdtemp())
+    >>> pipeline = ScreenshotPipeline(store, ScreenshotOptions('png', 0, 75, False, False))
+    >>> path = pipeline.put(SCREENSHOT_PNG)
+    >>> path == pipeline.put(SCREENSHOT_PNG), path.endswith('.png')
+    (True, True)
+    >>> pipeline.close()
+    >>> os.path.exists(os.path.join(store.report_dir, path))
+    True
+    """
+
+    def __init__(self, artifact_store, options, max_workers=2):
+        self.artifact_store = artifact_store
+        self.options = options
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='appium_screenshots')
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def put(self, png):
+        """Queue `png` to be transcoded and return the path of the result relative to the report directory"""
+        digest = hashlib.sha256(png + self.options.key.encode('ascii')).hexdigest()
+        path = self.artifact_store.path(digest, self.options.extension)
+        with self._lock:
+            if path not in self._futures and not self.artifact_store.exists(path):
+                self._futures[path] = self._executor.submit(self._write, path, png)
+        return path
+
+    def _write(self, path, png):
+        try:
+            data, _ = transcode(png, self.options)
+        except Exception as ex:
+            log.warning('Failed to transcode screenshot {0}, writing it as captured: {1}'.format(path, ex))
+            data = png
+        try:
+            self.artifact_store.write(path, data)
+        finally:
+            with self._lock:
+                self._futures.pop(path, None)
+
+    def close(self):
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+        wait(futures)
+        for future in futures:
+            if future.exception():
+                log.warning('Failed to write screenshot: {0}'.format(future.exception()))
+        self._executor.shutdown(wait=True)
+
+
+def get_screenshot_options(config):
+    if not hasattr(config, '_appium_screenshot_options'):
+        options = screenshot_options(config)
+        if Image is None and (options.format != 'png' or options.max_dimension or options.grayscale):
+            log.info('Pillow is not installed, screenshots are reported as captured')
+        config._appium_screenshot_options = options
+    return config._appium_screenshot_options
+
+
+def get_screenshot_pipeline(config, artifact_store):
+    """Return the session `ScreenshotPipeline` writing to `artifact_store`"""
+    if not hasattr(config, '_appium_screenshot_pipeline'):
+        config._appium_screenshot_pipeline = ScreenshotPipeline(artifact_store, get_screenshot_options(config))
+    return config._appium_screenshot_pipeline
+
+
+def close_screenshot_pipeline(config):
+    pipeline = config.__dict__.pop('_appium_screenshot_pipeline', None)
+    if pipeline is not None:
+        pipeline.close()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+from collections import Counter, OrderedDict
+
+from .exceptions import DevicePoolExhausted
+
+
+log = logging.getLogger(__name__)
+
+
+def capabilities_key(capabilities):
+    """
+    Normalized hash of a capabilities dict (key order does not matter)
+
+    >>> capabilities_key({'platformName': 'Android', 'app': 'a.apk'}) == capabilities_key({'app': 'a.apk', 'platformName': 'Android'})
+    True
+    >>> capabilities_key({'platformName': 'Android'}) == capabilities_key({'platformName': 'iOS'})
+    False
+    """
+    return hashlib.sha1(json.dumps(capabilities, sort_keys=True, default=str).encode('utf8')).hexdigest()[:12]
+
+
+def is_session_alive(driver):
+    """Cheap session level command. Appium ends sessions that sit idle beyond their newCommandTimeout"""
+    try:
+        driver.orientation
+        return True
+    except Exception as ex:
+        log.debug(f'Session {getattr(driver, "session_id", None)} failed its health check: {ex}')
+        return False
+
+
+class SessionPool():
+    """
+    Live driver sessions keyed by capabilities.
+
+    `start(capabilities)` returns a generator that yields a started driver and quits it when resumed
+    (the `driver` fixture). At most `maxsize` sessions are kept; starting another quits the least recently
+    used first (as does running out of devices to lease). A session returned to after another session was
+    used is health checked first and restarted if it has died.
+
+    >>> def start(capabilities):
+    ...     print('start', capabilities['app'])
+    ...     yield capabilities['app']
+    ...     print('quit', capabilities['app'])
+    >>> sessions = SessionPool(start)
+    >>> sessions.get({'app': 'a'})
+    start a
+    'a'
+    >>> sessions.get({'app': 'a'})
+    'a'
+    >>> sessions.get({'app': 'b'})
+    quit a
+    start b
+    'b'
+    >>> sessions.close()
+    quit b
+    >>> sessions.summary()
+    'appium sessions: 2 started for 2 capability sets, 0 reused, 1 evicted, 0 unhealthy'
+
+    >>> sessions = SessionPool(start, maxsize=2, health_check=lambda driver: driver != 'a')
+    >>> sessions.get({'app': 'a'}), sessions.get({'app': 'b'})
+    start a
+    start b
+    ('a', 'b')
+    >>> sessions.get({'app': 'a'})
+    quit a
+    start a
+    'a'
+    >>> sessions.get({'app': 'c'})
+    quit b
+    start c
+    'c'
+    """
+
+    def __init__(self, start, maxsize=1, health_check=is_session_alive):
+        self.start = start
+        self.maxsize = max(maxsize, 1)
+        self.health_check = health_check
+        self.started = Counter()
+        self.reused = 0
+        self.evicted = 0
+        self.unhealthy = 0
+        self._sessions = OrderedDict()
+
+    def _most_recent_key(self):
+        return next(reversed(self._sessions)) if self._sessions else None
+
+    def get(self, capabilities):
+        key = capabilities_key(capabilities)
+        if key in self._sessions:
+            driver = self._sessions[key][0]
+            if key == self._most_recent_key():
+                return driver
+            if self.health_check(driver):
+                self._sessions.move_to_end(key)
+                self.reused += 1
+                return driver
+            self.unhealthy += 1
+            self._quit(key, self._sessions.pop(key))
+        while len(self._sessions) >= self.maxsize:
+            self._evict()
+        while True:
+            session = self.start(capabilities)
+            try:
+                driver = next(session)
+            except DevicePoolExhausted:
+                if not self._sessions:
+                    raise
+                self._evict()  # frees its device
+                continue
+            break
+        self._sessions[key] = (driver, session)
+        self.started[key] += 1
+        log.debug(f'Started session {key} with capabilities {capabilities}')
+        return driver
+
+    def _evict(self):
+        self.evicted += 1
+        self._quit(*self._sessions.popitem(last=False))
+
+    def _quit(self, key, driver_session):
+        driver, session = driver_session
+        log.debug(f'Quitting session {key}')
+        try:
+            next(session, None)
+        except Exception as ex:
+            log.warning(f'Failed to quit session {key}: {ex}')
+
+    def close(self):
+        while self._sessions:
+            self._quit(*self._sessions.popitem(last=False))
+
+    def summary(self):
+        return (
+            f'appium sessions: {sum(self.started.values())} started for {len(self.started)} capability sets, '
+            f'{self.reused} reused, {self.evicted} evicted, {self.unhealthy} unhealthy'
+        )
@@ -0,0 +1,40 @@
+try:
+    from xdist.scheduler import LoadScheduling
+except ImportError:
+    LoadScheduling = object  # pytest-xdist is optional; this scheduler is only created by its pytest_xdist_make_scheduler hook
+
+
+class DurationScheduling(LoadScheduling):
+    """
+    xdist scheduling by expected duration (--appium_xdist_durations).
+
+    Workers collect the tests longest expected first (see `pytest_collection_modifyitems`). Each worker
+    starts with one test (and one queued) and is handed the next longest as it finishes one, so the long
+    UI tests are spread over the devices first and the short ones fill in at the end.
+    """
+
+    IN_FLIGHT = 2
+
+    def schedule(self):
+        assert self.collection_is_completed
+        if self.collection is not None:
+            for node in self.nodes:
+                self.check_schedule(node)
+            return
+        if not self._check_nodes_have_same_collection():
+            self.log('**Different tests collected, aborting run**')
+            return
+        self.collection = list(self.node2collection.values())[0]
+        self.pending[:] = range(len(self.collection))
+        for node in self.nodes:
+            self.check_schedule(node)
+
+    def check_schedule(self, node, duration=0):
+        if node.shutting_down:
+            return
+        if self.pending:
+            in_flight = len(self.node2pending[node])
+            if in_flight < self.IN_FLIGHT:
+                self._send_tests(node, self.IN_FLIGHT - in_flight)
+        else:
+            node.shutdown()
@@ -17,6 +17,9 @@ setup(
         'Appium-Python-Client',
         'wrapt',
     ],
+    extras_require={
+        'screenshots': ['Pillow'],
+    },
     url='http://git.int.thisisglobal.com/interactive/pytest-appium',
     author='Global',
     author_email='leicestersquare-interactive-developers@global.com',